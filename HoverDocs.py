@@ -4,6 +4,58 @@ import os
 import html
 import re
 import copy
+import contextlib
+from array import array
+
+from .hoverdocs import comments
+from .hoverdocs.cache_registry import CacheRegistry, string_cost
+from .hoverdocs.doc_cache import DocCache
+from .hoverdocs.resolution import ResolutionSnapshots
+from .hoverdocs.scope_spans import ScopeSpans, scope_stacks
+from .hoverdocs import extractors
+from .hoverdocs import highlight
+from .hoverdocs.trace import HoverTrace, write_trace
+from .hoverdocs import scheduler as hd_scheduler
+
+# All of the caches below share one memory budget, see hoverdocs/cache_registry.py.
+caches = CacheRegistry()
+
+# The rendered definition and comment for each symbol, by definition file.
+# Kept up to date by HoverDocsTextChangeListener.
+doc_cache = DocCache(caches, "docs")
+
+def _definitions_cost(path, file):
+	ret = 200
+	for (name, row), (def_str, comment_str, rows) in file["definitions"].items():
+		ret += 200 + string_cost(name, def_str, comment_str)
+	return ret
+
+# The raw definitions and comments from find_def_and_comment_fast, by definition file.
+definitions_cache = caches.create("definitions", _definitions_cost)
+
+# The symbol index results and open files, shared by all windows on the same project.
+# Refreshed by HoverDocsListener.on_load, on_post_save, on_close, and on_activated.
+snapshots = ResolutionSnapshots(caches, sublime.windows)
+
+# sublime re-indexes a saved file in the background, so the saved file's candidates are dropped
+# again after these delays (in milliseconds), in case they were looked up before the index caught up
+reindex_delays = [1000, 5000]
+
+# The interned scope stacks can't be evicted one at a time, but are counted and cleared with the rest.
+caches.register_external("scope_stacks", scope_stacks.nbytes, scope_stacks.clear)
+
+# Runs all of the HoverDocs background work, see hoverdocs/scheduler.py.
+# Callbacks are marshalled back to the main thread with sublime.set_timeout.
+scheduler = hd_scheduler.Scheduler(main_thread=sublime.set_timeout)
+
+def plugin_loaded():
+	scheduler.workers = max(2, sublime.load_settings("HoverDocs.sublime-settings").get("background_workers", 2))
+	scheduler.start()
+	caches.set_budget(sublime.load_settings("HoverDocs.sublime-settings").get("cache_memory_budget_mb", 64) * 1024 * 1024)
+
+def plugin_unloaded():
+	scheduler.shutdown()
+	caches.clear()
 
 class HoverDocsCommand(sublime_plugin.TextCommand):
 	""" Mostly here so that I can trick sublime into thinking there's a
@@ -18,6 +70,47 @@ class HoverDocsCommand(sublime_plugin.TextCommand):
 			reg = sublime.Region(int(reg_parts[0]), int(reg_parts[1]))
 			self.view.replace(edit, reg, characters)
 
+class HoverDocsCacheStatsCommand(sublime_plugin.WindowCommand):
+	""" Show the size, entries, hit ratio, and evictions of each cache in an output panel, along
+	with the background scheduler's queue metrics.
+	"""
+	def run(self):
+		total = caches.total + caches.external_size()
+		lines = [f"HoverDocs caches ({total / 1024:.1f} KiB of {caches.budget / 1024:.1f} KiB budget)", ""]
+		lines.append(f"{'cache':<14}{'size (KiB)':>12}{'entries':>10}{'hit ratio':>12}{'evictions':>12}")
+		for stat in caches.stats():
+			entries = "-" if stat["entries"] == None else str(stat["entries"])
+			hit_ratio = "-" if stat["hit_ratio"] == None else f"{stat['hit_ratio']:.1%}"
+			evictions = "-" if stat["evictions"] == None else str(stat["evictions"])
+			lines.append(f"{stat['name']:<14}{stat['size'] / 1024:>12.1f}{entries:>10}{hit_ratio:>12}{evictions:>12}")
+
+		sched_stats = scheduler.stats()
+		lines += ["", f"Background jobs ({sched_stats['background_running']} running)", ""]
+		lines.append(f"{'priority':<14}{'queued':>8}{'done':>8}{'failed':>8}{'cancelled':>11}{'rejected':>10}{'avg wait (ms)':>15}")
+		for name in hd_scheduler.priority_names:
+			m = sched_stats[name]
+			lines.append(f"{name:<14}{m['queued']:>8}{m['completed']:>8}{m['failed']:>8}{m['cancelled']:>11}{m['rejected']:>10}{m['wait_avg'] * 1000:>15.1f}")
+
+		self.window.destroy_output_panel("hd_cache_stats")
+		panel = self.window.create_output_panel("hd_cache_stats")
+		panel.run_command("hover_docs", { "mode": "append", "characters": "\n".join(lines) + "\n" })
+		self.window.run_command("show_panel", { "panel": "output.hd_cache_stats" })
+
+class HoverDocsTextChangeListener(sublime_plugin.TextChangeListener):
+	""" Keeps the doc_cache entries for a file valid while it's being edited, by dropping only
+	the entries whose lines were edited and moving the entries below each edit.
+	"""
+	@classmethod
+	def is_applicable(cls, buffer):
+		return True
+
+	def on_text_changed(self, changes):
+		path = self.buffer.file_name()
+		if path == None:
+			return
+		for change in changes:
+			doc_cache.apply_change(path, change.a.row, change.b.row, change.str.count("\n"))
+
 class HoverDocsListener(sublime_plugin.EventListener):
 	def __init__(self, *vargs, **kwargs):
 		super().__init__(*vargs, **kwargs)
@@ -26,13 +119,23 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		self.pinned_annotations = []
 		self.sel_snapshot = []
 		self.double_click_target = None
+		self.trace = None
 
 	def setting(self, setting):
 		return sublime.load_settings("HoverDocs.sublime-settings")[setting]
 
-	def find_symbol_definition(self, ref_view, ref_name):
+	def trace_stage(self, name):
+		""" Times the enclosed block as part of the current HoverTrace, if recording. """
+		if self.trace == None:
+			return contextlib.nullcontext()
+		return self.trace.stage(name)
+
+	def find_symbol_definition(self, ref_view, ref_name, ref_point=None):
 		""" Searches the sublime index of symbols for the closest matching definition of ref_name.
 
+		For member references ("self.run", "os.path", etc), the definitions are first narrowed down
+		to those in the receiver's class or module, see filter_by_receiver(...).
+
 		The "closest match" is according to the following rules, in order of presedence:
 		1. the ref_view's file
 		2. open files
@@ -43,13 +146,20 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		Args:
 		    ref_view: the view that the symbol reference is found in
 		    ref_name: the name of the symbol to look for
+		    ref_point: where the symbol reference starts in the ref_view, None to skip receiver filtering
 
 		Returns:
 			The definition SymbolLocation, or None if not found.
 			https://www.sublimetext.com/docs/api_reference.html#sublime.SymbolLocation
 		"""
-		win = sublime.active_window()
-		sym_locs = win.symbol_locations(sym=ref_name)
+		win = ref_view.window()
+		if win == None:
+			win = sublime.active_window()
+		sym_locs = snapshots.symbol_locations(win, ref_name)
+		if self.trace != None:
+			self.trace.set_candidates(ref_name, sym_locs)
+			if ref_point != None:
+				self.trace_ref_point(ref_view, ref_point)
 		if len(sym_locs) > 0:
 			_subl_definition_type = 1
 			sym_loc = None
@@ -62,6 +172,11 @@ class HoverDocsListener(sublime_plugin.EventListener):
 			if len(defs) == 0:
 				return None
 
+			# narrow down to the receiver's class or module
+			if ref_point != None and len(defs) > 1:
+				with self.trace_stage("filter_by_receiver"):
+					defs = self.filter_by_receiver(win, ref_view, ref_point, defs)
+
 			# presedence (1)
 			defs_samefile = list(filter(lambda sl: sl.path == ref_fn, defs))
 			if len(defs_samefile) > 0:
@@ -71,10 +186,7 @@ class HoverDocsListener(sublime_plugin.EventListener):
 			def get_view_syntax(fn):
 				if fn == None:
 					return None
-				for win2 in sublime.windows():
-					v2 = win2.find_open_file(fn)
-					if v2 != None:
-						break
+				v2 = snapshots.find_open_file(fn)
 				if v2 is None:
 					syntax = sublime.syntax_from_path(fn)
 				else:
@@ -125,10 +237,10 @@ class HoverDocsListener(sublime_plugin.EventListener):
 			# We filter down until there aren't any sym_locs left, or we've run out of filters.
 			# The order of the filters matters.
 			pathless       = lambda sl: not hasattr(sl,'path')
-			filter_open    = lambda locs: list(filter(lambda sl: pathless(sl) or win.find_open_file(sl.path) != None, locs))          # presedence (2)
-			filter_syntax  = lambda locs: list(filter(lambda sl: pathless(sl) or syntax_match(sl.path), locs))                        # presedence (3)
-			filter_extents = lambda locs: list(filter(lambda sl: pathless(sl) or ref_ext == None or sl.path.endswith(ref_ext), locs)) # presedence (4)
-			sort_ancestor  = lambda locs: list(sorted(locs, key=get_ancestor_dist))                                                   # presedence (5)
+			filter_open    = lambda locs: list(filter(lambda sl: pathless(sl) or snapshots.find_open_file(sl.path, win) != None, locs)) # presedence (2)
+			filter_syntax  = lambda locs: list(filter(lambda sl: pathless(sl) or syntax_match(sl.path), locs))                          # presedence (3)
+			filter_extents = lambda locs: list(filter(lambda sl: pathless(sl) or ref_ext == None or sl.path.endswith(ref_ext), locs))   # presedence (4)
+			sort_ancestor  = lambda locs: list(sorted(locs, key=get_ancestor_dist))                                                     # presedence (5)
 			filters = [filter_open, filter_syntax, filter_extents, sort_ancestor]
 
 			# Find the best fitting sym_loc
@@ -144,6 +256,194 @@ class HoverDocsListener(sublime_plugin.EventListener):
 			# print("No matching symbol at point")
 			return None
 
+	def filter_by_receiver(self, win, ref_view, ref_point, defs):
+		""" Narrows down the candidate definitions for a member reference based on its receiver.
+
+		The receiver is the token before the reference, for example "self" in "self.run".
+		- "self", "cls", "this": the class enclosing the reference (from ref_view.symbol_regions())
+		- an imported module alias (eg "np" for "import numpy as np"): definitions in that module
+		- a class name (including a class imported by name): definitions in that class
+
+		Args:
+		    win: the window to search the index of
+		    ref_view: the view that the symbol reference is found in
+		    ref_point: where the symbol reference starts in the ref_view
+		    defs: the candidate definition SymbolLocations
+		Returns:
+		    defs: The candidates in the receiver's class or module, nearest to the class first.
+		          The given defs if there's no receiver, or none of the candidates match.
+		"""
+		line = ref_view.line(ref_point)
+		pre_str = ref_view.substr(sublime.Region(line.a, ref_point))
+		m = re.search(r"([A-Za-z_$][\w$]*)\s*(?:\.|->|::)\s*$", pre_str)
+		if m == None:
+			return defs
+		receiver = m.group(1)
+
+		# module aliases
+		module_parts = None
+		if receiver not in ("self", "cls", "this"):
+			module_parts = self.get_module_for_alias(ref_view, receiver)
+		if module_parts != None:
+			def in_module(sl):
+				path = sl.path.replace("\\", "/")
+				stem = os.path.splitext(os.path.basename(path))[0]
+				return stem == module_parts[-1] or ("/"+module_parts[-1]+"/") in path
+			ret = list(filter(in_module, defs))
+			if len(ret) > 0:
+				return ret
+
+		# classes
+		if receiver in ("self", "cls", "this"):
+			class_name = self.get_enclosing_class(ref_view, ref_point)
+		else:
+			class_name = receiver
+		if class_name == None:
+			return defs
+		# only type definitions, not a function or variable that happens to have the receiver's name
+		class_sym_locs = snapshots.symbol_locations(win, class_name)
+		if self.trace != None:
+			self.trace.add_receiver_candidates(class_name, class_sym_locs)
+		class_locs = list(filter(lambda sl: sl.type == 1 and sl.kind[0] == sublime.KIND_ID_TYPE, class_sym_locs))
+		if len(class_locs) == 0:
+			return defs
+		def class_distance(sl):
+			# for open files, check that the enclosing class is the right one
+			v2 = snapshots.find_open_file(sl.path)
+			if v2 != None:
+				if self.get_enclosing_class(v2, v2.text_point(sl.row-1, sl.col-1)) != class_name:
+					return None
+			dists = [sl.row - cl.row for cl in class_locs if cl.path == sl.path and cl.row <= sl.row]
+			return None if len(dists) == 0 else min(dists)
+		dists = [(class_distance(sl), i) for i, sl in enumerate(defs)]
+		ret = [defs[i] for dist, i in sorted(filter(lambda d: d[0] != None, dists))]
+		return ret if len(ret) > 0 else defs
+
+	def get_enclosing_class(self, view, point):
+		""" Get the name of the class (or struct, etc) that the given point is in, or None.
+
+		The innermost class that starts before the point and still contains it (see class_contains(...)),
+		so that code after a class (for example "Foo::bar() { this->baz(); }") isn't attributed to it.
+		"""
+		for sym_reg in reversed(self.get_class_regions(view, point)):
+			if self.class_contains(view, sym_reg.region.a, point):
+				return sym_reg.name
+		return None
+
+	def get_class_regions(self, view, point):
+		""" The definition SymbolRegions of the classes (or structs, etc) that start before the point. """
+		class_scopes = re.compile(r"entity\.name\.(class|struct|type|interface|trait|impl|enum)")
+		ret = []
+		for sym_reg in view.symbol_regions():
+			if sym_reg.region.a > point:
+				break
+			if sym_reg.type != 1: # 1 == Definition
+				continue
+			if sym_reg.kind[0] == sublime.KIND_ID_TYPE or class_scopes.search(view.scope_name(sym_reg.region.a)) != None:
+				ret.append(sym_reg)
+		return ret
+
+	def trace_ref_point(self, ref_view, ref_point):
+		""" Record the parts of the ref_view that filter_by_receiver reads, rather than the whole view:
+		the symbol's line, the import lines (see get_module_for_alias(...)), and the lines from the
+		enclosing class to the symbol (see get_enclosing_class(...)).
+		"""
+		spans = [ref_view.line(ref_point)]
+		spans += [ref_view.line(reg) for reg in ref_view.find_all(r"\b(?:import|require)\b")]
+		classes = self.get_class_regions(ref_view, ref_point)
+		class_regions = []
+		if len(classes) > 0:
+			# the enclosing class, or the last class before the point if none contain it
+			enclosing = classes[-1]
+			for sym_reg in reversed(classes):
+				if self.class_contains(ref_view, sym_reg.region.a, ref_point):
+					enclosing = sym_reg
+					break
+			spans.append(ref_view.line(sublime.Region(enclosing.region.a, ref_point)))
+			class_regions = [sr for sr in classes if sr.region.a >= enclosing.region.a]
+		spans = [(reg.a, ref_view.substr(reg)) for reg in spans]
+		self.trace.set_ref_point(ref_point, ref_view.size(), spans, class_regions)
+
+	def class_contains(self, view, class_point, point):
+		""" Whether the class defined at class_point contains point, judging by indentation: every
+		line from the class to the point must be indented more than the class, other than blank
+		lines, comments, opening braces, closing parentheses (of a multi-line class header), and access specifiers ("public:").
+		"""
+		class_line = view.line(class_point)
+		point_line = view.line(point)
+		if point_line.a == class_line.a:
+			return True
+		tab_size = view.settings().get("tab_size")
+		tab_size = 4 if tab_size is None else tab_size
+		def indent(line):
+			return len(line.expandtabs(tab_size)) - len(line.expandtabs(tab_size).lstrip())
+		class_indent = indent(view.substr(class_line))
+		for line in view.substr(sublime.Region(class_line.b, point_line.b)).split("\n")[1:]:
+			stripped = line.strip()
+			if stripped == "" or stripped.startswith(("#", "//", "/*", "*", "{", ")")):
+				continue
+			if re.match(r"(public|private|protected|internal)\s*:", stripped) != None:
+				continue
+			if indent(line) <= class_indent:
+				return False
+		return True
+
+	def get_module_for_alias(self, view, alias):
+		""" Finds the module that the given name was imported as, for example
+		"import numpy.linalg as la" => ["numpy", "linalg"] for the alias "la".
+
+		Returns:
+		    module_parts: The module path, split into parts, or None if alias isn't an imported name.
+		"""
+		a = re.escape(alias)
+		patterns = [
+			# python
+			(r"^[ \t]*import[ \t]+([\w.]+)[ \t]+as[ \t]+"+a+r"\b", "$1"),
+			(r"^[ \t]*import[ \t]+("+a+r")\b(?![ \t]+as)", "$1"),
+			(r"^[ \t]*from[ \t]+([\w.]+)[ \t]+import[ \t]+.*?\b(\w+)[ \t]+as[ \t]+"+a+r"\b", "$1.$2"),
+			(r"^[ \t]*from[ \t]+([\w.]+)[ \t]+import[ \t]+(?:.*[ \t,(])?("+a+r")\b(?![ \t]+as)", "$1.$2"),
+			# javascript
+			(r"\bimport[ \t]+(?:\*[ \t]+as[ \t]+)?"+a+r"[ \t]+from[ \t]+['\"]([^'\"]+)['\"]", "$1"),
+			(r"\b"+a+r"[ \t]*=[ \t]*require\([ \t]*['\"]([^'\"]+)['\"]", "$1"),
+		]
+		for pattern, fmt in patterns:
+			extractions = []
+			view.find_all(pattern, 0, fmt, extractions)
+			if len(extractions) > 0:
+				parts = re.split(r"[./\\]+", extractions[0])
+				parts = list(filter(lambda p: p != "", parts))
+				if len(parts) > 0:
+					return parts
+		return None
+
+	def on_load(self, view):
+		snapshots.invalidate()
+
+	def on_activated(self, view):
+		# a new window, or a window's folders might have changed, but not the symbol index
+		snapshots.invalidate(candidates=False)
+
+	def on_post_save(self, view):
+		# the cached docs were kept up to date while editing, they just need the new mtime
+		if view.file_name() != None:
+			doc_cache.touch(view.file_name(), self.get_mtime(view.file_name()))
+		# only the candidates for the names in the saved file, or that are in the saved file
+		path = view.file_name()
+		names = set(sym_reg.name for sym_reg in view.symbol_regions() if sym_reg.type == 1) # 1 == Definition
+		snapshots.invalidate_file(path, names)
+		for delay in reindex_delays:
+			sublime.set_timeout(lambda: snapshots.invalidate_file(path, names), delay)
+
+	def on_revert(self, view):
+		if view.file_name() != None:
+			doc_cache.invalidate(view.file_name())
+
+	def on_close(self, view):
+		# any unsaved changes are gone
+		if view.file_name() != None and view.is_dirty():
+			doc_cache.invalidate(view.file_name())
+		snapshots.invalidate()
+
 	def on_text_command(self, view, command_name, args):
 		if command_name == "hover_docs":
 			if args == None:
@@ -211,6 +511,8 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		    sym_loc: The SymbolLocation, or None if not applicable
 		    sym_reg: The symbol region in the given view.
 		"""
+		if not _look_behind and self.trace == None and self.setting("hover_trace_file") != "":
+			return self.build_doc_parts_traced(view, point, force_doc_string, force_interface, force_hyperlink)
 		if _look_behind:
 			point -= 1
 		if point < 0 or point > view.size():
@@ -243,7 +545,8 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		# symbol at sym_reg must be a reference, try to find the definition
 		# try to find a definition with the same name in the index
 		sym_name = view.substr(sym_reg)
-		sym_loc = self.find_symbol_definition(view, sym_name)
+		with self.trace_stage("find_symbol_definition"):
+			sym_loc = self.find_symbol_definition(view, sym_name, sym_reg.a)
 		if sym_loc == None:
 			if not _look_behind:
 				return self.build_doc_parts(view, point, force_doc_string, force_interface, force_hyperlink, _look_behind=True)
@@ -252,14 +555,10 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		fn = os.path.basename(sym_loc.path)
 
 		# get the def_str and comment_str, with syntax applied via minihtml
-		v2, def_reg, comment_reg = self.find_def_and_comment(sym_loc, sym_name)
-		if v2 == 0:
+		parts = self.get_def_and_comment_strs(view, sym_loc, sym_name)
+		if parts == None:
 			return None, None, None
-		def_scopes, comment_scopes = self.get_scope_spans(v2, def_reg), self.get_scope_spans(v2, comment_reg)
-		def_str, comment_str = v2.substr(def_reg), v2.substr(comment_reg)
-		def_str = self.apply_syntax(v2, def_str, def_scopes)
-		comment_str, comment_scopes = self.reduce_comment_str(v2, comment_str, comment_scopes)
-		comment_str = self.apply_syntax(v2, comment_str, comment_scopes)
+		def_str, comment_str = parts
 		
 		# build the doc_str
 		doc_str = ""
@@ -274,6 +573,103 @@ class HoverDocsListener(sublime_plugin.EventListener):
 
 		return doc_str, sym_loc, sym_reg
 
+	def build_doc_parts_traced(self, view, point, force_doc_string=None, force_interface=None, force_hyperlink=None):
+		""" Same as build_doc_parts(...), but also records a HoverTrace to the "hover_trace_file"
+		setting, so that the hover can be replayed later with "python -m hoverdocs.replay".
+		"""
+		self.trace = HoverTrace()
+		try:
+			syntax_name = None if view.syntax() is None else view.syntax().name.lower()
+			self.trace.set_ref(view.file_name(), syntax_name, view.settings().get("tab_size"))
+			self.trace.set_settings(sublime.load_settings("HoverDocs.sublime-settings").to_dict())
+			with self.trace.stage("total"):
+				doc_str, sym_loc, sym_reg = self.build_doc_parts(view, point, force_doc_string, force_interface, force_hyperlink)
+
+			# record the definition file as it was at the time of the hover
+			if sym_loc != None:
+				text = None
+				def_view = snapshots.find_open_file(sym_loc.path)
+				if def_view != None:
+					text = def_view.substr(sublime.Region(0, def_view.size()))
+				if text == None:
+					try:
+						with open(sym_loc.path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+							text = f.read().replace("\r\n", "\n").replace("\r", "\n")
+					except OSError:
+						text = ""
+				syntax = sublime.find_syntax_for_file(sym_loc.path)
+				self.trace.set_definition(sym_loc, None if syntax is None else syntax.name.lower(), text, def_view != None)
+
+			if self.trace.record["token"] != None:
+				trace_file, record, files = self.setting("hover_trace_file"), self.trace.record, self.trace.files
+				token = scheduler.submit(lambda token: write_trace(trace_file, record, files), hd_scheduler.PRIORITY_MAINTENANCE)
+				if token == None: # queue is full
+					write_trace(trace_file, record, files)
+		finally:
+			self.trace = None
+		return doc_str, sym_loc, sym_reg
+
+	def get_def_and_comment_strs(self, view, sym_loc, sym_name):
+		""" Get the definition and comment strings for the given symbol, with syntax applied via minihtml.
+		Cached in doc_cache until the lines they came from are edited.
+
+		Args:
+		    view: the view that the symbol reference is found in
+		    sym_loc: The SymbolLocation for the symbol. Probably from find_symbol_definition(...)
+		    sym_name: The string representing the name of the symbol.
+		Returns:
+		    def_str, comment_str: The definition and comment html, or None if the definition file can't be loaded.
+		"""
+		def_row = sym_loc.row-1
+		mtime = self.get_mtime(sym_loc.path)
+		cached = doc_cache.get(sym_loc.path, sym_name, def_row, mtime)
+		if cached != None:
+			return cached
+
+		with self.trace_stage("find_def_and_comment_fast"):
+			fast_parts = self.find_def_and_comment_fast(sym_loc, sym_name)
+		if fast_parts != None:
+			def_str, comment_str, syntax_name, rows = fast_parts
+			tab_size = view.settings().get("tab_size")
+			tab_size = 4 if tab_size is None else tab_size
+			with self.trace_stage("reduce_comment_str"):
+				comment_str = comments.reduce_comment_text(comment_str, syntax_name, self.setting("multi_line_docstrings"), tab_size)
+			with self.trace_stage("apply_syntax"):
+				def_str = self.apply_syntax(view, def_str, highlight.scope_spans(def_str, syntax_name))
+				comment_str = self.apply_syntax(view, comment_str, highlight.comment_spans(comment_str, syntax_name))
+		else:
+			with self.trace_stage("find_def_and_comment"):
+				v2, def_reg, comment_reg = self.find_def_and_comment(sym_loc, sym_name)
+			if v2 == None:
+				return None
+
+			# the rows (in the definition file) that the docs depend on
+			row_offset = def_row - v2.rowcol(def_reg.a)[0]
+			rows = [v2.rowcol(def_reg.a)[0], v2.rowcol(def_reg.b)[0]]
+			if comment_reg.size() > 0:
+				rows += [v2.rowcol(comment_reg.a)[0], v2.rowcol(comment_reg.b)[0]]
+			rows = [row+row_offset for row in rows]
+
+			with self.trace_stage("get_scope_spans"):
+				def_scopes, comment_scopes = self.get_scope_spans(v2, def_reg), self.get_scope_spans(v2, comment_reg)
+			def_str, comment_str = v2.substr(def_reg), v2.substr(comment_reg)
+			with self.trace_stage("apply_syntax"):
+				def_str = self.apply_syntax(v2, def_str, def_scopes)
+			with self.trace_stage("reduce_comment_str"):
+				comment_str, comment_scopes = self.reduce_comment_str(v2, comment_str, comment_scopes)
+			with self.trace_stage("apply_syntax"):
+				comment_str = self.apply_syntax(v2, comment_str, comment_scopes)
+
+		# find_def_and_comment(...) also looks at the lines just before and after for the comment
+		doc_cache.put(sym_loc.path, sym_name, def_row, min(rows)-1, max(rows)+1, (def_str, comment_str), mtime)
+		return def_str, comment_str
+
+	def get_mtime(self, path):
+		try:
+			return os.path.getmtime(path)
+		except OSError:
+			return None
+
 	def add_docs(self, view, doc_regs, doc_strs, sym_locs, is_hover=False, is_double_click=False, is_keybinding=False, force_display_style=""):
 		# add close buttons
 		auto_hide = True
@@ -316,7 +712,7 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		Args:
 		    view: the view that the comment_str was extracted from
 		    comment_str: the comment to modify
-		    comment_scopes: a list of [idx, len, scope_names] that matches the given comment_str
+		    comment_scopes: the ScopeSpans that match the given comment_str
 		Returns:
 		    comment_str: The modified string value
 		    comment_scopes: The modified scopes, whose regions have been modified to match the
@@ -326,28 +722,21 @@ class HoverDocsListener(sublime_plugin.EventListener):
 			return comment_str, comment_scopes
 
 		# prepare a system for tracking reductions
-		# each reduction has the values "newpos", "oldpos", and "length"
-		new_comment_scopes = []
-		for cs in comment_scopes:
-			end_pos = cs[0] + cs[1]
-			new_comment_scopes.append([cs[0], cs[1], cs[2], end_pos])
+		# each scope span is tracked by its start and end positions
+		cs_starts = array('I', comment_scopes.offsets)
+		cs_ends = array('I', (comment_scopes.offsets[i] + comment_scopes.lengths[i] for i in range(len(comment_scopes))))
 		def reduce_string(strval, pos, length):
 			if length == 0:
 				return strval
 
 			# first, apply the reduction to the comment_scopes
-			to_remove = []
-			for cs in new_comment_scopes:
-				for p in [0, 3]:
-					if cs[p] >= pos:
-						if cs[p] >= pos+length:
-							cs[p] -= length
+			for positions in [cs_starts, cs_ends]:
+				for i in range(len(positions)):
+					if positions[i] >= pos:
+						if positions[i] >= pos+length:
+							positions[i] -= length
 						else:
-							cs[p] = pos
-				if cs[0] == cs[3]:
-					to_remove.append(cs)
-			for cs in to_remove:
-				new_comment_scopes.remove(cs)
+							positions[i] = pos
 
 			# now reduce the string
 			if pos == 0:
@@ -439,10 +828,10 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		tab_str = " "*tab_size
 		tab_idx = comment_str.find("\t")
 		while tab_idx >= 0:
-			for cs in new_comment_scopes:
-				for p in [0, 3]:
-					if cs[p] > tab_idx:
-						cs[p] += tab_size-1
+			for positions in [cs_starts, cs_ends]:
+				for i in range(len(positions)):
+					if positions[i] > tab_idx:
+						positions[i] += tab_size-1
 			comment_str = comment_str[:tab_idx] + tab_str + comment_str[tab_idx+1:]
 			tab_idx = comment_str.find("\t")
 
@@ -517,10 +906,11 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		comment_str = remove_empty_lines(comment_str)
 		comment_str = remove_common_whitespace(comment_str)
 
-		# update the "lengths" of the comment_scopes
-		for cs in new_comment_scopes:
-			cs[1] = cs[3] - cs[0]
-			del cs[3]
+		# update the "lengths" of the comment_scopes, dropping the spans that were reduced away
+		new_comment_scopes = ScopeSpans()
+		for i in range(len(cs_starts)):
+			if cs_ends[i] > cs_starts[i]:
+				new_comment_scopes.append(cs_starts[i], cs_ends[i] - cs_starts[i], comment_scopes.stack_ids[i])
 
 		return comment_str, new_comment_scopes
 
@@ -539,15 +929,7 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		"""
 		multi_line_docstrings = self.setting("multi_line_docstrings")
 		syntax_name = "" if view.syntax() is None else view.syntax().name.lower()
-		if syntax_name in multi_line_docstrings:
-			comment_str_rs = comment_str.rstrip()
-			comment_str_ls = comment_str_rs.lstrip()
-			for comment_markings in multi_line_docstrings[syntax_name]:
-				cm_start, cm_end = comment_markings[0], comment_markings[1]
-				cm_mid = "" if len(comment_markings) < 3 else comment_markings[2]
-				if comment_str_ls.startswith(cm_start) and comment_str_rs.endswith(cm_end):
-					return True, cm_start, cm_mid, cm_end
-		return False, "", "", ""
+		return comments.get_comment_is_docstring(comment_str, syntax_name, multi_line_docstrings)
 
 	def apply_syntax(self, view, strval, scope_spans):
 		""" Inserts minihtml into the given string to match the syntax of the given spans.
@@ -555,7 +937,7 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		Args:
 		    view: The view that the given string is from.
 		    strval: The string to insert the syntax into.
-		    scope_spans: A list of [idx, len, scope_name] used to get the syntax.
+		    scope_spans: The ScopeSpans used to get the syntax.
 		Returns:
 		    str_wsyntax: The string with html markup inserted.
 		"""
@@ -564,9 +946,10 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		# get the default foreground color
 		default_style = view.style_for_scope('')
 
-		for scope_span in scope_spans:
+		style_strs = {} # stack id -> style_str, since most spans share a handful of scope stacks
+		for i in range(len(scope_spans)):
 			# split the string into scope span pieces
-			idx, length, scope_names = scope_span
+			idx, length, stack_id = scope_spans.offsets[i], scope_spans.lengths[i], scope_spans.stack_ids[i]
 			strpart = strval[idx:idx+length]
 
 			# html encode the string
@@ -574,27 +957,31 @@ class HoverDocsListener(sublime_plugin.EventListener):
 			strpart = re.sub(r" ( +)", lambda m: "&nbsp;"*len(m.group(0)), strpart)
 			strpart = strpart.replace("\n","<br>")
 
-			# get the style for this scope
-			style = view.style_for_scope(scope_names[0])
-			for scope_name in scope_names[1:]:
-				tmp_style = view.style_for_scope(scope_name)
-				if 'foreground' in default_style and style['foreground'] == default_style['foreground']:
-					style = tmp_style
-				if 'foreground' in default_style and tmp_style['foreground'] != default_style['foreground']:
-					style = tmp_style
-
-			# apply the syntax for this piece
-			style_str = f"<div style='display:inline;"
-			if "foreground" in style:
-				style_str += f" color:{style['foreground']};"
-			if "background" in style:
-				style_str += f" background-color:{style['background']};"
-			if "bold" in style and style["bold"]:
-				style_str += " font-weight:bold;"
-			if "italic" in style and style["italic"]:
-				style_str += " font-style:italic;"
-			if "underline" in style and style["underline"]:
-				style_str += " text-decoration:underline;"
+			style_str = style_strs.get(stack_id)
+			if style_str == None:
+				# get the style for this scope
+				scope_names = scope_stacks[stack_id]
+				style = view.style_for_scope(scope_names[0])
+				for scope_name in scope_names[1:]:
+					tmp_style = view.style_for_scope(scope_name)
+					if 'foreground' in default_style and style['foreground'] == default_style['foreground']:
+						style = tmp_style
+					if 'foreground' in default_style and tmp_style['foreground'] != default_style['foreground']:
+						style = tmp_style
+
+				# apply the syntax for this piece
+				style_str = f"<div style='display:inline;"
+				if "foreground" in style:
+					style_str += f" color:{style['foreground']};"
+				if "background" in style:
+					style_str += f" background-color:{style['background']};"
+				if "bold" in style and style["bold"]:
+					style_str += " font-weight:bold;"
+				if "italic" in style and style["italic"]:
+					style_str += " font-style:italic;"
+				if "underline" in style and style["underline"]:
+					style_str += " text-decoration:underline;"
+				style_strs[stack_id] = style_str
 			ret += f"{style_str}'>{strpart}</div>"
 
 		return ret
@@ -613,11 +1000,7 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		                 the symbol. Empty region if not found.
 		"""
 		# find the view for the given sym_loc, if already opened somewhere
-		windows = [sublime.active_window()] + sublime.windows()
-		for window in windows:
-			v2 = window.find_open_file(sym_loc.path)
-			if v2 != None:
-				break
+		v2 = snapshots.find_open_file(sym_loc.path)
 
 		# load in a new view for this unopened file
 		if v2 == None:
@@ -689,10 +1072,10 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		for line in [sym_line, pre_line, post_line]:
 			scope_spans = self.get_scope_spans(v2, line)
 			tmp_comment_reg = None
-			for ss in scope_spans:
+			for ss_idx, ss_len, ss_names in scope_spans:
 				# is this scope span part of a comment
 				found = False
-				for scope_name in ss[2]:
+				for scope_name in ss_names:
 					if "comment" in scope_name:
 						found = True
 						break
@@ -700,7 +1083,7 @@ class HoverDocsListener(sublime_plugin.EventListener):
 					continue
 
 				# expand the scope span
-				for pnt in [line.a+ss[0], line.a+ss[0]+ss[1]-1]:
+				for pnt in [line.a+ss_idx, line.a+ss_idx+ss_len-1]:
 					reg = v2.extract_scope(pnt)
 					if reg != None:
 						if tmp_comment_reg == None:
@@ -729,6 +1112,85 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		
 		return v2, def_reg, comment_reg
 
+	def find_def_and_comment_fast(self, sym_loc, sym_name):
+		""" Like find_def_and_comment(...), but reads the definition and comment straight from the
+		file text with a registered extractor (see hoverdocs/extractors.py), without creating a view.
+
+		Only used for files that aren't already open, since open files have already been parsed.
+
+		Args:
+		    sym_loc: The SymbolLocation for the symbol. Probably from find_symbol_definition(...)
+		    sym_name: The string representing the name of the symbol.
+		Returns:
+		    None if there's no extractor for the file (use find_def_and_comment(...) instead), or
+		    def_str: The definition of the symbol.
+		    comment_str: The raw comment for the symbol. Empty string if not found.
+		    syntax_name: The lower-case syntax name of the file.
+		    rows: The 0-based rows of the start and end of the definition and comment.
+		"""
+		if not self.setting("use_fast_extractors"):
+			return None
+		if snapshots.find_open_file(sym_loc.path) != None:
+			return None
+
+		mtime = self.get_mtime(sym_loc.path)
+		file = definitions_cache.get(sym_loc.path, count=False)
+		if file == None or file["mtime"] != mtime:
+			definitions_cache.record(False)
+			file = self.extract_definitions(sym_loc.path, mtime)
+			if file == None:
+				return None
+			definitions_cache.put(sym_loc.path, file)
+		else:
+			definitions_cache.record(True)
+
+		parts = file["definitions"].get((sym_name, sym_loc.row-1))
+		if parts == None:
+			return None
+		def_str, comment_str, rows = parts
+		return def_str, comment_str, file["syntax_name"], rows
+
+	def extract_definitions(self, path, mtime):
+		""" Extract every definition and comment in the given file, for definitions_cache.
+
+		Returns:
+		    None if there's no extractor for the file, or the file is too large, or a dict with:
+		    mtime: the given modification time
+		    syntax_name: the lower-case syntax name of the file
+		    definitions: {(name, 0-based row): (def_str, comment_str, rows)}, see find_def_and_comment_fast(...)
+		"""
+		syntax = sublime.find_syntax_for_file(path)
+		if syntax == None:
+			return None
+		syntax_name = syntax.name.lower()
+		extractor = extractors.get_extractor(syntax_name)
+		if extractor == None:
+			return None
+
+		# like find_def_and_comment, don't read all of a large file
+		large_size = sublime.load_settings("Preferences.sublime-settings").get("syntax_detection_size_limit", 16*1024*1024)
+		try:
+			if os.path.getsize(path) >= large_size:
+				return None
+			with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+				text = f.read().replace("\r\n", "\n").replace("\r", "\n")
+		except OSError:
+			return None
+		definitions = extractor(text, syntax_name, self.setting("multi_line_docstrings"))
+		if definitions == None:
+			return None
+
+		line_starts = extractors.get_line_starts(text)
+		ret = {}
+		for d in definitions:
+			if (d.name, d.row) in ret:
+				continue
+			rows = [extractors.row_for_offset(line_starts, d.def_reg[0]), extractors.row_for_offset(line_starts, d.def_reg[1])]
+			if d.comment_reg[1] > d.comment_reg[0]:
+				rows += [extractors.row_for_offset(line_starts, d.comment_reg[0]), extractors.row_for_offset(line_starts, d.comment_reg[1])]
+			ret[(d.name, d.row)] = (text[d.def_reg[0]:d.def_reg[1]], text[d.comment_reg[0]:d.comment_reg[1]], rows)
+		return { "mtime": mtime, "syntax_name": syntax_name, "definitions": ret }
+
 	def expand_to_scope(self, view, point, matching_scopes):
 		""" Finds the extent of the region that matches the given scopes.
 
@@ -777,27 +1239,26 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		    view: The containing view of the given region.
 		    reg: The region to look in.
 		Returns:
-		    scope_spans: A list of [idx, len, scope_names].
+		    scope_spans: The ScopeSpans for the region.
 		"""
-		scope_spans = []
+		scope_spans = ScopeSpans()
 
-		last = []
+		last = -1
 		start = 0
 		cnt = 1
 		for i in range(reg.a, reg.a+reg.size()+1):
-			scope_names = view.scope_name(i).split(" ")
-			scope_names = list(filter(lambda s: s != "", scope_names))
+			stack_id = scope_stacks.intern(view.scope_name(i))
 			if i == reg.a:
-				last = scope_names
+				last = stack_id
 				cnt = 1
-			elif last == scope_names:
+			elif last == stack_id:
 				cnt += 1
-			else: # last != scope_names
-				scope_spans.append([start, cnt, last])
+			else: # last != stack_id
+				scope_spans.append(start, cnt, last)
 				start = i - reg.a
-				last = scope_names
+				last = stack_id
 				cnt = 1
-		scope_spans.append([start, cnt, last])
+		scope_spans.append(start, cnt, last)
 
 		return scope_spans
 
@@ -836,11 +1297,7 @@ class HoverDocsListener(sublime_plugin.EventListener):
 		sym_loc = sym_locs[index]
 
 		# find the view with the given symbol
-		v2 = None
-		for win in sublime.windows():
-			v2 = win.find_open_file(sym_loc.path)
-			if v2 != None:
-				break
+		v2 = snapshots.find_open_file(sym_loc.path)
 
 		if action == "close":
 			view.erase_regions("hd_hover")
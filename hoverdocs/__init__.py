@@ -0,0 +1,7 @@
+""" Sublime-independent pieces of HoverDocs.
+
+Nothing in this package imports sublime or sublime_plugin, so that it can be
+used both from the plugin (HoverDocs.py) and from the command line, for example:
+
+    python -m hoverdocs path/to/project > docs.jsonl
+"""
@@ -0,0 +1,4 @@
+from .export import main
+
+if __name__ == "__main__":
+	main()
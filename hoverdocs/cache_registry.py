@@ -0,0 +1,211 @@
+""" One memory budget for all of the HoverDocs caches.
+
+Each cache is a GovernedCache created by the CacheRegistry, with a cost function that estimates
+the size of each entry in bytes. The registry keeps a single least-recently-used order across
+the entries of every cache, and when the total cost goes over the budget it evicts the least
+recently used entries (from whichever cache they're in) until it's back under.
+
+Caches that can't give up individual entries (for example the interned scope stack table) can be
+registered with register_external(...). Their size counts towards the budget, and when the budget is
+exceeded they're cleared first, before any entries are evicted. They're also included in the stats
+and cleared with everything else.
+"""
+import collections
+import sys
+import threading
+
+def string_cost(*strs):
+	""" Approximate size in bytes of the given strings. """
+	return sum(sys.getsizeof(s) for s in strs)
+
+class GovernedCache:
+	""" A key/value cache whose entries are evicted by its CacheRegistry. """
+	def __init__(self, registry, name, cost, count=None):
+		"""
+		Args:
+		    registry: the CacheRegistry that governs this cache
+		    name: the name to show in the stats
+		    cost: called with (key, value) to get the approximate size of an entry in bytes
+		    count: called with (key, value) to get how many items an entry holds, for the stats,
+		           None to count each entry as one
+		"""
+		self.registry = registry
+		self.name = name
+		self.cost = cost
+		self.count = count
+		self.entries = {}
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key, default=None, count=True):
+		""" Get the value for key, marking it as recently used.
+
+		Args:
+		    count: False to not count this towards the hits and misses, see record(...)
+		"""
+		with self.registry.lock:
+			if key not in self.entries:
+				if count:
+					self.misses += 1
+				return default
+			if count:
+				self.hits += 1
+			self.registry._touch(self, key)
+			return self.entries[key]
+
+	def peek(self, key, default=None):
+		""" Get the value for key, without marking it as used or counting it as a hit/miss. """
+		with self.registry.lock:
+			return self.entries.get(key, default)
+
+	def record(self, hit):
+		""" Count a hit or miss, for caches that do their own lookups within an entry. """
+		with self.registry.lock:
+			if hit:
+				self.hits += 1
+			else:
+				self.misses += 1
+
+	def put(self, key, value):
+		""" Add or replace the value for key (also to update its cost, if the value was modified). """
+		with self.registry.lock:
+			self.entries[key] = value
+			self.registry._add(self, key, self.cost(key, value))
+
+	def pop(self, key, default=None):
+		with self.registry.lock:
+			if key not in self.entries:
+				return default
+			self.registry._remove(self, key)
+			return self.entries.pop(key)
+
+	def clear(self):
+		with self.registry.lock:
+			for key in list(self.entries.keys()):
+				self.registry._remove(self, key)
+			self.entries = {}
+
+	def keys(self):
+		with self.registry.lock:
+			return list(self.entries.keys())
+
+	def __contains__(self, key):
+		return key in self.entries
+
+	def __len__(self):
+		return len(self.entries)
+
+	def _evict(self, key):
+		self.entries.pop(key, None)
+		self.evictions += 1
+
+class CacheRegistry:
+	def __init__(self, budget=64*1024*1024):
+		"""
+		Args:
+		    budget: the maximum total cost of all GovernedCache entries, in bytes
+		"""
+		self.budget = budget
+		self.lock = threading.RLock()
+		self.caches = collections.OrderedDict() # name -> GovernedCache
+		self.externals = collections.OrderedDict() # name -> (size, clear)
+		self.lru = collections.OrderedDict() # (name, key) -> cost, least recently used first
+		self.costs = {} # name -> total cost
+		self.total = 0
+
+	def create(self, name, cost, count=None):
+		""" Create and register a GovernedCache. See GovernedCache.__init__. """
+		with self.lock:
+			cache = GovernedCache(self, name, cost, count)
+			self.caches[name] = cache
+			self.costs[name] = 0
+			return cache
+
+	def register_external(self, name, size, clear):
+		""" Register a cache that manages its own entries.
+
+		Args:
+		    size: called to get the approximate size of the cache in bytes, on every update of any
+		          cache, so it should be cheap
+		    clear: called to empty the cache, when over budget
+		"""
+		with self.lock:
+			self.externals[name] = [size, clear, 0] # size, clear, times cleared for the budget
+			self._enforce()
+
+	def set_budget(self, budget):
+		with self.lock:
+			self.budget = budget
+			self._enforce()
+
+	def clear(self):
+		""" Empty all registered caches. """
+		with self.lock:
+			for cache in self.caches.values():
+				cache.entries = {}
+			for size, clear, clears in self.externals.values():
+				clear()
+			self.lru = collections.OrderedDict()
+			self.costs = { name: 0 for name in self.caches }
+			self.total = 0
+
+	def stats(self):
+		""" Returns a list of dicts with the name, entries, size, hits, misses, hit_ratio, and evictions of each cache.
+		entries is the number of items, see GovernedCache.__init__'s count, while evictions is in whole entries.
+		For external caches, evictions is how many times they've been cleared for the budget.
+		"""
+		with self.lock:
+			ret = []
+			for name, cache in self.caches.items():
+				lookups = cache.hits + cache.misses
+				if cache.count == None:
+					entries = len(cache.entries)
+				else:
+					entries = sum(cache.count(key, value) for key, value in cache.entries.items())
+				ret.append({
+					"name": name,
+					"entries": entries,
+					"size": self.costs[name],
+					"hits": cache.hits,
+					"misses": cache.misses,
+					"hit_ratio": None if lookups == 0 else cache.hits / lookups,
+					"evictions": cache.evictions,
+				})
+			for name, (size, clear, clears) in self.externals.items():
+				ret.append({ "name": name, "entries": None, "size": size(), "hits": None, "misses": None, "hit_ratio": None, "evictions": clears })
+			return ret
+
+	def _touch(self, cache, key):
+		self.lru.move_to_end((cache.name, key))
+
+	def _add(self, cache, key, cost):
+		lru_key = (cache.name, key)
+		old_cost = self.lru.pop(lru_key, 0)
+		self.lru[lru_key] = cost
+		self.costs[cache.name] += cost - old_cost
+		self.total += cost - old_cost
+		self._enforce()
+
+	def _remove(self, cache, key):
+		cost = self.lru.pop((cache.name, key), 0)
+		self.costs[cache.name] -= cost
+		self.total -= cost
+
+	def external_size(self):
+		""" The total size of the external caches, in bytes. """
+		with self.lock:
+			return sum(external[0]() for external in self.externals.values())
+
+	def _enforce(self):
+		""" Clear the external caches, then evict the least recently used entries, until the total cost is within budget. """
+		if self.total + self.external_size() > self.budget:
+			for external in self.externals.values():
+				if external[0]() > 0:
+					external[1]()
+					external[2] += 1
+		while self.total > self.budget and len(self.lru) > 0:
+			(name, key), cost = self.lru.popitem(last=False)
+			self.costs[name] -= cost
+			self.total -= cost
+			self.caches[name]._evict(key)
@@ -0,0 +1,287 @@
+""" Text-only versions of the HoverDocs comment handling.
+
+HoverDocsListener.reduce_comment_str and HoverDocsListener.find_def_and_comment
+lean on a sublime view for syntax scopes and the "toggle_comment" command. The
+functions here do the same work with plain strings, using the tables below in
+place of the syntax definitions.
+"""
+import os
+
+# Lower-case syntax names (as returned by view.syntax().name.lower()), by file extension.
+syntax_for_extension = {
+	".py":   "python",
+	".pyw":  "python",
+	".c":    "c",
+	".h":    "c",
+	".cc":   "c++",
+	".cpp":  "c++",
+	".cxx":  "c++",
+	".hh":   "c++",
+	".hpp":  "c++",
+	".hxx":  "c++",
+	".cs":   "c#",
+	".go":   "go",
+	".java": "java",
+	".js":   "javascript",
+	".jsx":  "javascript",
+	".mjs":  "javascript",
+	".cjs":  "javascript",
+	".kt":   "kotlin",
+	".kts":  "kotlin",
+	".mm":   "objective-c",
+	".php":  "php",
+	".rs":   "rust",
+}
+
+# Single line comment markers, by syntax name.
+# This stands in for the "toggle_comment" command when there isn't a view to run it in.
+line_comments = {
+	"python":      ["#"],
+	"c":           ["//"],
+	"c++":         ["//"],
+	"c#":          ["///", "//"],
+	"go":          ["//"],
+	"java":        ["//"],
+	"javascript":  ["//"],
+	"kotlin":      ["//"],
+	"objective-c": ["//"],
+	"php":         ["//", "#"],
+	"rust":        ["//!", "///", "//"],
+}
+
+def get_syntax_name(path):
+	""" Guess the lower-case syntax name for the given file path, or None if unknown. """
+	ext = os.path.splitext(path)[1].lower()
+	return syntax_for_extension.get(ext)
+
+def get_comment_is_docstring(comment_str, syntax_name, multi_line_docstrings):
+	""" Determine if the comment string is a doc string, and
+	return the doc string markings for said comment.
+
+	Args:
+		comment_str: the comment string to inspect
+		syntax_name: the lower-case name of the syntax that the comment was written in
+		multi_line_docstrings: the "multi_line_docstrings" setting
+	Returns:
+		is_docstr: True if the comment is a docstring, False otherwise
+		cm_start: The opening docstring marking
+		cm_mid: The per-line docstring marking (could be empty string)
+		cm_end: The closing docstring marking
+	"""
+	if syntax_name in multi_line_docstrings:
+		comment_str_rs = comment_str.rstrip()
+		comment_str_ls = comment_str_rs.lstrip()
+		for comment_markings in multi_line_docstrings[syntax_name]:
+			cm_start, cm_end = comment_markings[0], comment_markings[1]
+			cm_mid = "" if len(comment_markings) < 3 else comment_markings[2]
+			if comment_str_ls.startswith(cm_start) and comment_str_rs.endswith(cm_end):
+				return True, cm_start, cm_mid, cm_end
+	return False, "", "", ""
+
+def split_line(strval, ws_loc="left"):
+	""" Returns the preceeding whitespace, and the following rest of the string.
+
+	Args:
+	    ws_loc: "left" for normal operation, or "right" to instead return the
+	            trailing whitespace and the preceeding rest of the string
+	Returns:
+	    ws: the preceeding (or trailing) whitespace
+	    nonws: the trailing (or preceeding) rest of the string
+	"""
+	if ws_loc == "left":
+		non_whitespace = strval.lstrip()
+		whitespace = strval[:len(strval) - len(non_whitespace)]
+	else:
+		non_whitespace = strval.rstrip()
+		whitespace = strval[len(non_whitespace):]
+	return whitespace, non_whitespace
+
+def _strip_marker(line, marker):
+	""" Removes the marker (and up to one following space) from the front of the line. """
+	ws, nonws = split_line(line)
+	if marker == "" or not nonws.startswith(marker):
+		return line
+	nonws = nonws[len(marker):]
+	if nonws[:1].isspace():
+		nonws = nonws[1:]
+	return ws + nonws
+
+def _remove_empty_lines(lines):
+	while len(lines) > 0 and len(lines[0].strip()) == 0:
+		lines = lines[1:]
+	while len(lines) > 0 and len(lines[-1].strip()) == 0:
+		lines = lines[:-1]
+	if len(lines) > 0:
+		lines[-1] = lines[-1].rstrip()
+	return lines
+
+def _remove_common_whitespace(lines):
+	common_whitespace = None
+	for line in lines:
+		if len(line.strip()) == 0:
+			continue
+		ws_len = len(split_line(line)[0])
+		if common_whitespace == None or ws_len < common_whitespace:
+			common_whitespace = ws_len
+	if not common_whitespace:
+		return lines
+	return [line[common_whitespace:] for line in lines]
+
+def reduce_comment_text(comment_str, syntax_name, multi_line_docstrings, tab_size=4):
+	""" Removes the comment markings from the given comment string and trims the common leading
+	whitespace off of the comment. Text-only counterpart to HoverDocsListener.reduce_comment_str.
+
+	Args:
+	    comment_str: the comment to modify
+	    syntax_name: the lower-case name of the syntax that the comment was written in
+	    multi_line_docstrings: the "multi_line_docstrings" setting
+	    tab_size: how many spaces to replace each tab with
+	Returns:
+	    comment_str: The modified string value
+	"""
+	if len(comment_str.strip()) == 0:
+		return comment_str
+
+	# remove white space 1
+	comment_str = comment_str.replace("\t", " "*tab_size)
+	lines = comment_str.replace("\r\n", "\n").split("\n")
+	lines = _remove_common_whitespace(_remove_empty_lines(lines))
+
+	# remove language-specific multiline docstrings
+	is_docstr, cm_start, cm_mid, cm_end = get_comment_is_docstring("\n".join(lines), syntax_name, multi_line_docstrings)
+	if is_docstr:
+		if cm_end == "":
+			# line-based docstrings, for example rust's "///"
+			lines = [_strip_marker(line, cm_start) for line in lines]
+		else:
+			lines[0] = _strip_marker(lines[0], cm_start)
+			lines[-1] = split_line(lines[-1].rstrip()[:-len(cm_end)], "right")[1]
+			if cm_mid != "":
+				lines = [_strip_marker(line, cm_mid) for line in lines]
+
+	# remove the per-line comment markings from the comment string
+	else:
+		markers = line_comments.get(syntax_name, [])
+		for i in range(len(lines)):
+			for marker in markers:
+				stripped = _strip_marker(lines[i], marker)
+				if stripped != lines[i]:
+					lines[i] = stripped
+					break
+
+	# remove white space 2
+	lines = _remove_common_whitespace(_remove_empty_lines(lines))
+
+	return "\n".join(lines)
+
+def _find_docstring_end(lines, row, col, cm_end):
+	""" Find the (row, col) just past the first cm_end at or after lines[row][col:]. """
+	for r in range(row, len(lines)):
+		idx = lines[r].find(cm_end, col if r == row else 0)
+		if idx >= 0:
+			return r, idx+len(cm_end)
+	return None
+
+def _find_docstring_start(lines, row, col, cm_start):
+	""" Find the (row, col) of the last cm_start at or before lines[row][:col]. """
+	for r in range(row, -1, -1):
+		idx = lines[r].rfind(cm_start, 0, col if r == row else len(lines[r]))
+		if idx >= 0:
+			return r, idx
+	return None
+
+def find_comment_span(lines, def_row, def_end_row, syntax_name, multi_line_docstrings, def_col=0):
+	""" Find the comment on, immediately above, or immediately below a definition.
+
+	Follows the same order as HoverDocsListener.find_def_and_comment: the definition line, then
+	the line(s) above it, then the line(s) below it. The first comment found is used, unless a
+	later one is a docstring (see get_comment_is_docstring), in which case the docstring wins.
+
+	Args:
+	    lines: the file contents, split into lines (without line endings)
+	    def_row: the 0-based line that the definition starts on
+	    def_end_row: the 0-based line that the definition ends on (for multi-line parameter lists)
+	    syntax_name: the lower-case syntax name of the file
+	    multi_line_docstrings: the "multi_line_docstrings" setting
+	    def_col: the 0-based column of the symbol name on def_row
+	Returns:
+	    span: (start_row, start_col, end_row, end_col) with the end exclusive, or None if not found.
+	          The span includes the leading whitespace of the first comment line.
+	"""
+	markers = line_comments.get(syntax_name, [])
+	docstrings = [dm for dm in multi_line_docstrings.get(syntax_name, []) if dm[1] != ""]
+	line_docstrings = [dm[0] for dm in multi_line_docstrings.get(syntax_name, []) if dm[1] == ""]
+
+	def is_line_comment(line):
+		nonws = line.lstrip()
+		for marker in markers + line_docstrings:
+			if nonws.startswith(marker):
+				return True
+		return False
+
+	def on_line():
+		line = lines[def_row]
+		best = None
+		for marker in markers:
+			idx = line.find(marker, def_col)
+			if idx >= 0 and (best == None or idx < best):
+				best = idx
+		if best == None:
+			return None
+		return (def_row, best, def_row, len(line))
+
+	def above():
+		row = def_row - 1
+		if row < 0:
+			return None
+		line = lines[row].rstrip()
+		for dm in docstrings:
+			if line.endswith(dm[1]):
+				start = _find_docstring_start(lines, row, len(line)-len(dm[1]), dm[0])
+				if start != None:
+					return (start[0], 0, row, len(line))
+		if not is_line_comment(line):
+			return None
+		start = row
+		while start > 0 and is_line_comment(lines[start-1]):
+			start -= 1
+		return (start, 0, row, len(line))
+
+	def below():
+		row = def_end_row + 1
+		if row >= len(lines):
+			return None
+		line = lines[row]
+		nonws = line.lstrip()
+		for dm in docstrings:
+			if nonws.startswith(dm[0]):
+				col = len(line) - len(nonws)
+				end = _find_docstring_end(lines, row, col+len(dm[0]), dm[1])
+				if end != None:
+					return (row, 0, end[0], end[1])
+		if not is_line_comment(line):
+			return None
+		end = row
+		while end < len(lines)-1 and is_line_comment(lines[end+1]):
+			end += 1
+		return (row, 0, end, len(lines[end]))
+
+	comment_span = None
+	for finder in [on_line, above, below]:
+		span = finder()
+		if span == None:
+			continue
+		if comment_span == None:
+			comment_span = span
+		if get_comment_is_docstring(get_span_text(lines, span), syntax_name, multi_line_docstrings)[0]:
+			comment_span = span
+			break
+	return comment_span
+
+def get_span_text(lines, span):
+	""" Returns the text for a (start_row, start_col, end_row, end_col) span. """
+	start_row, start_col, end_row, end_col = span
+	if start_row == end_row:
+		return lines[start_row][start_col:end_col]
+	parts = [lines[start_row][start_col:]] + lines[start_row+1:end_row] + [lines[end_row][:end_col]]
+	return "\n".join(parts)
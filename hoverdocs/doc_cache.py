@@ -0,0 +1,113 @@
+""" A cache of the docs for each definition, which survives edits to the definition file.
+
+Each entry remembers which lines of its file it was built from: the definition and comment
+lines, plus the line before and after them (which is where find_def_and_comment looks for a
+comment). When a file is edited, only the entries whose lines were touched are dropped, and the
+entries below the edit are moved up or down to match.
+
+The entries are stored per file in a GovernedCache (see cache_registry.py), so whole files are
+evicted when the memory budget is exceeded. The cache's stats count the entries, not the files.
+"""
+from .cache_registry import CacheRegistry, string_cost
+
+# rough per-entry overhead, in bytes, for the key tuple and [first_row, last_row, value] list
+_entry_overhead = 200
+
+def _file_cost(path, file):
+	ret = _entry_overhead
+	for (name, row), entry in file["entries"].items():
+		value = entry[2]
+		ret += _entry_overhead + string_cost(name)
+		if isinstance(value, tuple):
+			ret += string_cost(*value)
+		else:
+			ret += string_cost(value)
+	return ret
+
+class DocCache:
+	def __init__(self, registry=None, name="docs"):
+		"""
+		Args:
+		    registry: the CacheRegistry to store the entries in, None for an unbounded private registry
+		    name: the name of the cache in the registry
+		"""
+		if registry == None:
+			registry = CacheRegistry(budget=float("inf"))
+		# path -> {"mtime": float, "entries": {(name, row): [first_row, last_row, value]}}
+		self.files = registry.create(name, _file_cost, lambda path, file: len(file["entries"]))
+
+	def get(self, path, name, row, mtime=None):
+		""" Get the cached value for the definition of name on the given 0-based row.
+
+		Args:
+		    path: the definition file
+		    name: the symbol name
+		    row: the 0-based row of the definition
+		    mtime: the file's current modification time, to catch changes made outside the editor
+		Returns:
+		    value: the cached value, or None if not cached
+		"""
+		file = self.files.get(path, count=False)
+		if file == None:
+			self.files.record(False)
+			return None
+		if mtime != None and file["mtime"] != None and mtime != file["mtime"]:
+			self.files.pop(path)
+			self.files.record(False)
+			return None
+		entry = file["entries"].get((name, row))
+		self.files.record(entry != None)
+		if entry == None:
+			return None
+		return entry[2]
+
+	def put(self, path, name, row, first_row, last_row, value, mtime=None):
+		""" Cache the value for the definition of name on the given 0-based row.
+
+		Args:
+		    first_row, last_row: the (inclusive) rows that the value depends on
+		    value: the value to cache
+		    mtime: the file's current modification time
+		"""
+		file = self.files.peek(path)
+		if file == None or (mtime != None and file["mtime"] != mtime):
+			file = { "mtime": mtime, "entries": {} }
+		file["entries"][(name, row)] = [first_row, last_row, value]
+		self.files.put(path, file)
+
+	def apply_change(self, path, first_row, last_row, new_rows):
+		""" Update the entries for an edit that replaced the text from first_row through last_row
+		with text containing new_rows newlines.
+
+		Entries that depend on any of the edited rows are dropped. Entries below the edit are moved.
+		"""
+		file = self.files.peek(path)
+		if file == None:
+			return
+		delta = new_rows - (last_row - first_row)
+		entries = {}
+		for key, entry in file["entries"].items():
+			if entry[1] < first_row:
+				entries[key] = entry
+			elif entry[0] > last_row:
+				entry[0] += delta
+				entry[1] += delta
+				entries[(key[0], key[1]+delta)] = entry
+		if len(entries) != len(file["entries"]):
+			file["entries"] = entries
+			self.files.put(path, file)
+		else:
+			file["entries"] = entries
+
+	def touch(self, path, mtime):
+		""" Update the modification time for a file, for example after it's been saved from the editor. """
+		file = self.files.peek(path)
+		if file != None:
+			file["mtime"] = mtime
+
+	def invalidate(self, path):
+		""" Drop all the entries for a file. """
+		self.files.pop(path)
+
+	def clear(self):
+		self.files.clear()
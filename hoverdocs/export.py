@@ -0,0 +1,205 @@
+""" Headless documentation export.
+
+Walks a project, finds the definitions in every recognized source file, and writes one JSON
+object per definition (JSON Lines) with the definition signature and the normalized comment.
+Runs without sublime; the files are spread across a process pool.
+
+Usage:
+    python -m hoverdocs [-j JOBS] [-o OUT] [--settings FILE] [--exclude NAME] [--max-size BYTES] PATH...
+
+Each output line looks like:
+    {"path": "...", "syntax": "python", "name": "foo", "row": 12, "col": 5,
+     "definition": "foo(a, b)", "comment": "Does the foo.", "is_docstring": true}
+
+Rows and columns are 1-based, the same as sublime's SymbolLocation.
+Files that can't be extracted are skipped, with a warning on stderr.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+
+from . import comments
+from . import extractors
+
+default_settings_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HoverDocs.sublime-settings")
+default_excludes = [".git", ".hg", ".svn", "__pycache__", "node_modules", ".tox", ".nox", ".venv", "venv"]
+
+def load_settings(path):
+	""" Load a .sublime-settings file, which is JSON plus comments and trailing commas.
+
+	Args:
+	    path: the settings file to load
+	Returns:
+	    settings: the settings dict
+	"""
+	with open(path, 'r', encoding='utf-8') as f:
+		text = f.read()
+
+	# remove the comments, leaving the strings alone
+	ret = []
+	i, in_str = 0, False
+	while i < len(text):
+		c = text[i]
+		if in_str:
+			ret.append(c)
+			if c == "\\":
+				ret.append(text[i+1:i+2])
+				i += 1
+			elif c == "\"":
+				in_str = False
+		elif c == "\"":
+			in_str = True
+			ret.append(c)
+		elif text.startswith("//", i):
+			while i < len(text) and text[i] != "\n":
+				i += 1
+			continue
+		elif text.startswith("/*", i):
+			end = text.find("*/", i+2)
+			i = len(text) if end < 0 else end+2
+			continue
+		else:
+			ret.append(c)
+		i += 1
+	text = "".join(ret)
+
+	# remove trailing commas
+	text = re.sub(r",(\s*[}\]])", r"\1", text)
+	return json.loads(text)
+
+# per-worker state, set by _init_worker
+_worker_settings = {}
+
+def _init_worker(multi_line_docstrings, tab_size, max_size):
+	_worker_settings["multi_line_docstrings"] = multi_line_docstrings
+	_worker_settings["tab_size"] = tab_size
+	_worker_settings["max_size"] = max_size
+
+def extract_file(path):
+	""" Extract all definitions and their comments from one file.
+
+	Args:
+	    path: the file to read
+	Returns:
+	    records: A list of dicts, one per definition (see the module docstring).
+	"""
+	syntax_name = comments.get_syntax_name(path)
+	multi_line_docstrings = _worker_settings["multi_line_docstrings"]
+	tab_size = _worker_settings["tab_size"]
+	try:
+		if os.path.getsize(path) > _worker_settings["max_size"]:
+			return []
+		with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+			text = f.read().replace("\r\n", "\n").replace("\r", "\n")
+	except OSError:
+		return []
+
+	ret = []
+	for d in extractors.extract_definitions(text, syntax_name, multi_line_docstrings):
+		comment_str, is_docstr = "", False
+		if d.comment_reg[1] > d.comment_reg[0]:
+			raw_comment = text[d.comment_reg[0]:d.comment_reg[1]]
+			is_docstr = comments.get_comment_is_docstring(raw_comment, syntax_name, multi_line_docstrings)[0]
+			comment_str = comments.reduce_comment_text(raw_comment, syntax_name, multi_line_docstrings, tab_size)
+		ret.append({
+			"path": path,
+			"syntax": syntax_name,
+			"name": d.name,
+			"row": d.row+1,
+			"col": d.col+1,
+			"definition": text[d.def_reg[0]:d.def_reg[1]],
+			"comment": comment_str,
+			"is_docstring": is_docstr,
+		})
+	return ret
+
+def _extract_file_or_error(path):
+	""" extract_file(...), but catches any exception so that one bad file doesn't stop the export.
+
+	Returns:
+	    path: the given path, since the process pool returns results out of order
+	    records: the records for the file, [] on an error
+	    error: None, or a description of the exception raised
+	"""
+	try:
+		return path, extract_file(path), None
+	except Exception as e:
+		return path, [], f"{type(e).__name__}: {e}"
+
+def iter_source_files(roots, excludes):
+	""" Yields the paths of the recognized source files under the given roots. """
+	excludes = set(excludes)
+	for root in roots:
+		if os.path.isfile(root):
+			if comments.get_syntax_name(root) != None:
+				yield root
+			continue
+		for dirpath, dirnames, filenames in os.walk(root):
+			dirnames[:] = sorted(d for d in dirnames if d not in excludes)
+			for fn in sorted(filenames):
+				if comments.get_syntax_name(fn) != None:
+					yield os.path.join(dirpath, fn)
+
+def export(roots, out, jobs=None, settings=None, excludes=None, max_size=1024*1024, chunksize=32):
+	""" Extract the docs for every definition under roots, and write them as JSON Lines.
+
+	Args:
+	    roots: the files and directories to search
+	    out: a text stream to write to
+	    jobs: the number of worker processes, 1 to run in this process, None for one per cpu
+	    settings: the HoverDocs settings dict, None to load the package defaults
+	    excludes: directory names to skip, None for default_excludes
+	    max_size: skip files larger than this many bytes
+	    chunksize: how many files to hand each worker at a time
+	Returns:
+	    count: the number of records written
+	"""
+	if settings == None:
+		settings = load_settings(default_settings_path)
+	if excludes == None:
+		excludes = default_excludes
+	initargs = (settings.get("multi_line_docstrings", {}), settings.get("tab_size", 4), max_size)
+	paths = iter_source_files(roots, excludes)
+
+	count = 0
+	def write(path, records, error):
+		nonlocal count
+		if error != None:
+			print(f"hoverdocs: warning: skipping {path}: {error}", file=sys.stderr)
+		for record in records:
+			out.write(json.dumps(record) + "\n")
+			count += 1
+
+	if jobs == 1:
+		_init_worker(*initargs)
+		for path in paths:
+			write(*_extract_file_or_error(path))
+	else:
+		with multiprocessing.Pool(processes=jobs, initializer=_init_worker, initargs=initargs) as pool:
+			for path, records, error in pool.imap_unordered(_extract_file_or_error, paths, chunksize=chunksize):
+				write(path, records, error)
+	return count
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m hoverdocs", description="Export HoverDocs definitions and comments as JSON Lines.")
+	parser.add_argument("paths", nargs="+", help="files or directories to search")
+	parser.add_argument("-o", "--output", default="-", help="file to write to (default: stdout)")
+	parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: one per cpu)")
+	parser.add_argument("--settings", action="append", default=[], help="extra .sublime-settings file(s) to apply over the defaults")
+	parser.add_argument("--exclude", action="append", default=[], help="extra directory name(s) to skip")
+	parser.add_argument("--max-size", type=int, default=1024*1024, help="skip files larger than this many bytes")
+	args = parser.parse_args(argv)
+
+	settings = load_settings(default_settings_path)
+	for path in args.settings:
+		settings.update(load_settings(path))
+
+	out = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+	try:
+		export(args.paths, out, jobs=args.jobs, settings=settings, excludes=default_excludes+args.exclude, max_size=args.max_size)
+	finally:
+		if out is not sys.stdout:
+			out.close()
@@ -0,0 +1,345 @@
+""" Per-language definition and comment extractors that work directly on file text.
+
+HoverDocsListener.find_def_and_comment loads the definition file into a hidden view and waits
+for sublime to parse it, which is a lot of work just to find one comment. The extractors here
+find the same definition and comment regions straight from the text, for the languages they
+are registered for. Other languages should fall back to the view-based path (in the plugin) or
+to extract_generic (headless).
+
+Extractors are registered by lower-case syntax name, the same keys as the "multi_line_docstrings"
+setting, and are called as extractor(text, syntax_name, multi_line_docstrings). They return a list
+of Definition for the whole file, or None if they can't handle the text (for example, on a syntax
+error), in which case the caller should fall back.
+"""
+import ast
+import bisect
+import collections
+import re
+
+from . import comments
+
+# name: the symbol name
+# row, col: 0-based position of the symbol name
+# def_reg: (a, b) character offsets of the definition, from the name to the end of the parameters
+# comment_reg: (a, b) character offsets of the raw comment, (0, 0) if not found
+Definition = collections.namedtuple("Definition", ["name", "row", "col", "def_reg", "comment_reg"])
+
+extractors = {}
+
+def register_extractor(*syntax_names):
+	""" Decorator to register an extractor function for the given syntax names. """
+	def register(func):
+		for syntax_name in syntax_names:
+			extractors[syntax_name] = func
+		return func
+	return register
+
+def get_extractor(syntax_name):
+	""" Returns the extractor for the given lower-case syntax name, or None if there isn't one. """
+	return extractors.get(syntax_name)
+
+def extract_definitions(text, syntax_name, multi_line_docstrings):
+	""" Extract the definitions with the registered extractor, falling back to extract_generic.
+
+	Args:
+	    text: the file contents, with "\\n" line endings
+	    syntax_name: the lower-case syntax name of the file
+	    multi_line_docstrings: the "multi_line_docstrings" setting
+	Returns:
+	    definitions: A list of Definition.
+	"""
+	extractor = get_extractor(syntax_name)
+	if extractor != None:
+		ret = extractor(text, syntax_name, multi_line_docstrings)
+		if ret != None:
+			return ret
+	return extract_generic(text, syntax_name, multi_line_docstrings)
+
+def get_line_starts(text):
+	""" Returns the character offset of the start of each line. """
+	ret = [0]
+	idx = text.find("\n")
+	while idx >= 0:
+		ret.append(idx+1)
+		idx = text.find("\n", idx+1)
+	return ret
+
+def row_for_offset(line_starts, offset):
+	""" Returns the 0-based row of the given character offset, see get_line_starts. """
+	return bisect.bisect_right(line_starts, offset) - 1
+
+##############################################
+# generic (regular expression) extraction
+##############################################
+
+# Regular expressions for finding definitions, by syntax name. Each must have a "name" group.
+_c_keyword_defs = re.compile(r"^\s*(?:(?:pub|pub\(crate\)|export|default|public|private|protected|internal|static|abstract|final|sealed|data|open|async|unsafe|extern|inline|virtual|partial)\s+)*"
+                             r"(?:class|struct|enum|union|interface|trait|fn|func|fun|function|namespace|object|impl|type)\s+\*?(?P<name>[A-Za-z_]\w*)")
+_c_function_defs = re.compile(r"^\s*(?:[A-Za-z_][\w:<>,\*&\[\]]*[\s\*&]+)+(?P<name>[A-Za-z_]\w*)\s*\(")
+_go_method_defs = re.compile(r"^\s*func\s+\([^)]*\)\s*(?P<name>[A-Za-z_]\w*)")
+_python_defs = re.compile(r"^\s*(?:async\s+)?(?:def|class)\s+(?P<name>[A-Za-z_]\w*)")
+_non_definitions = set(["if", "for", "while", "switch", "return", "sizeof", "else", "catch", "new", "delete", "throw", "case", "do", "goto", "typeof", "await", "yield"])
+definition_patterns = {
+	"python":      [_python_defs],
+	"c":           [_c_keyword_defs, _c_function_defs],
+	"c++":         [_c_keyword_defs, _c_function_defs],
+	"c#":          [_c_keyword_defs, _c_function_defs],
+	"go":          [_go_method_defs, _c_keyword_defs],
+	"java":        [_c_keyword_defs, _c_function_defs],
+	"javascript":  [_c_keyword_defs],
+	"kotlin":      [_c_keyword_defs],
+	"objective-c": [_c_keyword_defs, _c_function_defs],
+	"php":         [_c_keyword_defs],
+	"rust":        [_c_keyword_defs],
+}
+
+def find_definitions(lines, syntax_name):
+	""" Find the definitions in the given file contents.
+
+	Args:
+	    lines: the file contents, split into lines (without line endings)
+	    syntax_name: the lower-case syntax name of the file
+	Returns:
+	    definitions: A list of (name, row, col, end_row, def_str), with 0-based row and col.
+	                 Like HoverDocsListener.find_def_and_comment, def_str starts at the symbol
+	                 name and includes the parameters, if any.
+	"""
+	ret = []
+	patterns = definition_patterns.get(syntax_name, [])
+	for row in range(len(lines)):
+		line = lines[row]
+		for pattern in patterns:
+			m = pattern.match(line)
+			if m == None:
+				continue
+			# statements and calls that look like c function definitions ("return foo(...)", "else if (...)")
+			if pattern is _c_function_defs and m.group("name") in _non_definitions:
+				continue
+			col = m.start("name")
+			end_row, def_str = _expand_parameters(lines, row, col, m.end("name"))
+			ret.append((m.group("name"), row, col, end_row, def_str))
+			break
+	return ret
+
+def _expand_parameters(lines, row, col, name_end):
+	""" Expand the definition to the closing parenthesis of the parameter list, if there is one. """
+	line = lines[row]
+	rest = line[name_end:]
+	if not rest.lstrip().startswith("("):
+		return row, line[col:name_end]
+
+	# find the matching parenthesis, spanning multiple lines if necessary (up to a limit)
+	depth = 0
+	parts = []
+	r, start = row, name_end + (len(rest) - len(rest.lstrip()))
+	while r < len(lines) and r < row + 50:
+		text = lines[r]
+		for i in range(start, len(text)):
+			if text[i] == "(":
+				depth += 1
+			elif text[i] == ")":
+				depth -= 1
+				if depth == 0:
+					parts.append(text[:i+1] if r != row else text[col:i+1])
+					return r, "\n".join(parts)
+		parts.append(text if r != row else text[col:])
+		r, start = r+1, 0
+	return row, line[col:name_end]
+
+def extract_generic(text, syntax_name, multi_line_docstrings):
+	""" Line-based extraction for any syntax in definition_patterns, using comments.find_comment_span. """
+	lines = text.split("\n")
+	line_starts = get_line_starts(text)
+	ret = []
+	for name, row, col, end_row, def_str in find_definitions(lines, syntax_name):
+		def_a = line_starts[row] + col
+		comment_reg = (0, 0)
+		span = comments.find_comment_span(lines, row, end_row, syntax_name, multi_line_docstrings, def_col=col)
+		if span != None:
+			comment_reg = (line_starts[span[0]] + span[1], line_starts[span[2]] + span[3])
+		ret.append(Definition(name, row, col, (def_a, def_a+len(def_str)), comment_reg))
+	return ret
+
+##############################################
+# python
+##############################################
+
+def _char_col(line, byte_col):
+	""" Converts an ast utf-8 byte offset into a character offset. """
+	if line.isascii():
+		return byte_col
+	return len(line.encode("utf-8")[:byte_col].decode("utf-8", errors="replace"))
+
+# Strings (with any prefix), "#" comments, and brackets.
+_python_tokens = re.compile(r'[rRbBuUfF]{0,2}(?:"""(?:\\.|[^\\])*?(?:"""|\Z)|' r"'''(?:\\.|[^\\])*?(?:'''|\Z)|"
+                            r'"(?:\\.|[^"\\\n])*"?|' r"'(?:\\.|[^'\\\n])*'?)"
+                            r"|#[^\n]*|[()\[\]{}]", re.S)
+
+def _python_definition_nodes(tree):
+	""" The function and class definitions in the tree. Only statement bodies are searched, since
+	definitions can't appear inside expressions.
+	"""
+	stack = [tree]
+	while len(stack) > 0:
+		node = stack.pop()
+		if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+			yield node
+		for field in ("body", "orelse", "finalbody", "handlers"):
+			children = getattr(node, field, None)
+			if isinstance(children, list):
+				stack.extend(children)
+
+@register_extractor("python")
+def extract_python(text, syntax_name, multi_line_docstrings):
+	""" Finds definitions with ast, and their docstrings or "#" comments with a single regular expression scan. """
+	try:
+		tree = ast.parse(text)
+	except (SyntaxError, ValueError, MemoryError, RecursionError):
+		# MemoryError and RecursionError are raised for deeply nested code (eg "((((...1))))")
+		return None
+	lines = text.split("\n")
+	line_starts = get_line_starts(text)
+
+	# in a single pass, find:
+	# the rows with comments, and where on the row the comment starts
+	# the offset just past the matching closing bracket, for each opening bracket
+	comment_cols = {}
+	paren_ends = {}
+	open_parens = []
+	for m in _python_tokens.finditer(text):
+		tok = m.group(0)
+		if tok in "([{":
+			open_parens.append(m.start())
+		elif tok in ")]}":
+			if len(open_parens) > 0:
+				paren_ends[open_parens.pop()] = m.end()
+		elif tok[0] == "#":
+			row = row_for_offset(line_starts, m.start())
+			comment_cols[row] = m.start() - line_starts[row]
+	def is_comment_line(row):
+		return row in comment_cols and lines[row][:comment_cols[row]].strip() == ""
+
+	ret = []
+	for node in _python_definition_nodes(tree):
+		row = node.lineno-1
+		m = _python_defs.match(lines[row])
+		if m == None or m.group("name") != node.name:
+			continue
+		col = m.start("name")
+
+		# the definition: the name, through to the end of the parameters
+		def_a = line_starts[row] + col
+		def_b = line_starts[row] + m.end("name")
+		rest = lines[row][m.end("name"):]
+		if rest.lstrip().startswith("("):
+			def_b = paren_ends.get(def_b + len(rest) - len(rest.lstrip()), def_b)
+
+		# the comment: the docstring, or a comment on the definition line, or the comment lines above
+		comment_reg = (0, 0)
+		first = node.body[0] if len(node.body) > 0 else None
+		if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+			start_row, end_row = first.lineno-1, first.end_lineno-1
+			start_col = _char_col(lines[start_row], first.col_offset)
+			if lines[start_row][:start_col].strip() == "":
+				start_col = 0
+			comment_reg = (line_starts[start_row] + start_col, line_starts[end_row] + _char_col(lines[end_row], first.end_col_offset))
+		elif row in comment_cols and comment_cols[row] > col:
+			comment_reg = (line_starts[row] + comment_cols[row], line_starts[row] + len(lines[row]))
+		else:
+			top = min([row] + [d.lineno-1 for d in node.decorator_list])
+			end_row = top-1
+			start_row = end_row
+			while start_row >= 0 and is_comment_line(start_row):
+				start_row -= 1
+			start_row += 1
+			if start_row <= end_row:
+				comment_reg = (line_starts[start_row], line_starts[end_row] + len(lines[end_row]))
+
+		ret.append(Definition(node.name, row, col, (def_a, def_b), comment_reg))
+	ret.sort(key=lambda d: d.def_reg[0])
+	return ret
+
+##############################################
+# c-family
+##############################################
+
+# Strings, character literals, line comments, and block comments, by syntax name.
+# Character literals are length limited so that rust lifetimes ('a) don't swallow code. Syntaxes
+# without character literals match whole single quoted strings instead.
+_c_comments = r"|//[^\n]*|/\*.*?(?:\*/|\Z)"
+_c_tokens = re.compile(r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n]){1,10}'" + _c_comments, re.S)
+_c_tokens_by_syntax = {
+	"go":         re.compile(r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n]){1,10}'|`[^`]*`" + _c_comments, re.S),
+	"javascript": re.compile(r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`" + _c_comments, re.S),
+	"php":        re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'" + _c_comments, re.S),
+}
+
+def scan_c_comments(text, syntax_name=None):
+	""" A linear scan for the comments in c-family text.
+
+	Consecutive line comments ("//", "///") on adjacent lines are merged into a single comment.
+
+	Args:
+	    syntax_name: the lower-case syntax name, for its string syntax (eg javascript template literals)
+	Returns:
+	    comment_regs: A list of (a, b) character offsets for each comment, in order.
+	"""
+	ret = []
+	for m in _c_tokens_by_syntax.get(syntax_name, _c_tokens).finditer(text):
+		if m.group(0)[0] != "/":
+			continue
+		a, b = m.span()
+		if m.group(0).startswith("//") and len(ret) > 0:
+			prev_a, prev_b = ret[-1]
+			between = text[prev_b:a]
+			if text.startswith("//", prev_a) and between.count("\n") == 1 and between.strip() == "":
+				ret[-1] = (prev_a, b)
+				continue
+		ret.append((a, b))
+	return ret
+
+@register_extractor("c", "c++", "c#", "go", "java", "javascript", "kotlin", "objective-c", "php", "rust")
+def extract_c_family(text, syntax_name, multi_line_docstrings):
+	""" Finds definitions with definition_patterns, and their "/** */", "///", etc comments with scan_c_comments. """
+	lines = text.split("\n")
+	line_starts = get_line_starts(text)
+	comment_regs = scan_c_comments(text, syntax_name)
+	comment_starts = [reg[0] for reg in comment_regs]
+	comment_end_rows = {}
+	comment_start_rows = {}
+	for reg in comment_regs:
+		comment_end_rows[row_for_offset(line_starts, reg[1])] = reg
+		comment_start_rows.setdefault(row_for_offset(line_starts, reg[0]), reg)
+
+	def with_leading_whitespace(reg):
+		line_a = line_starts[row_for_offset(line_starts, reg[0])]
+		if text[line_a:reg[0]].strip() == "":
+			return (line_a, reg[1])
+		return reg
+
+	ret = []
+	for name, row, col, end_row, def_str in find_definitions(lines, syntax_name):
+		def_a = line_starts[row] + col
+		def_b = def_a + len(def_str)
+
+		# same order as find_def_and_comment: on the line, above, below, with docstrings winning
+		candidates = []
+		idx = bisect.bisect_left(comment_starts, def_b)
+		if idx < len(comment_regs) and comment_regs[idx][0] < line_starts[row] + len(lines[row]):
+			candidates.append(comment_regs[idx])
+		if row-1 in comment_end_rows:
+			candidates.append(comment_end_rows[row-1])
+		if end_row+1 in comment_start_rows:
+			candidates.append(comment_start_rows[end_row+1])
+
+		comment_reg = (0, 0)
+		for reg in candidates:
+			reg = with_leading_whitespace(reg)
+			if comment_reg == (0, 0):
+				comment_reg = reg
+			if comments.get_comment_is_docstring(text[reg[0]:reg[1]], syntax_name, multi_line_docstrings)[0]:
+				comment_reg = reg
+				break
+
+		ret.append(Definition(name, row, col, (def_a, def_b), comment_reg))
+	return ret
@@ -0,0 +1,131 @@
+""" Approximate syntax highlighting for the text read by the extractors.
+
+Definitions that come from an extractor (see extractors.py) were never parsed by sublime, so
+they don't have any scopes to style them with. scope_spans(...) lexes a definition string and
+assigns each token a scope name like sublime's syntaxes would (eg "entity.name.function.python",
+"variable.parameter.python", "storage.type.c"), so that HoverDocsListener.apply_syntax(...) can
+color it with the user's color scheme.
+
+This isn't a full syntax definition, just enough for the name and parameters of a definition.
+"""
+import re
+
+from .scope_spans import ScopeSpans, scope_stacks
+
+# syntax name -> the suffix that sublime's syntaxes put on their scope names
+scope_suffixes = {
+	"python":      "python",
+	"c":           "c",
+	"c++":         "c++",
+	"c#":          "cs",
+	"go":          "go",
+	"java":        "java",
+	"javascript":  "js",
+	"kotlin":      "kotlin",
+	"objective-c": "objc",
+	"php":         "php",
+	"rust":        "rust",
+}
+
+_python_keywords = set(["def", "class", "async", "lambda", "and", "or", "not", "in", "is", "if", "else", "await", "yield"])
+_c_keywords = set(["const", "static", "inline", "virtual", "extern", "unsafe", "pub", "fn", "func", "fun", "function", "class",
+                   "struct", "enum", "union", "interface", "trait", "impl", "type", "mut", "ref", "out", "in", "params", "final",
+                   "public", "private", "protected", "internal", "override", "abstract", "async", "where", "dyn", "let", "var", "val"])
+_c_types = set(["void", "bool", "char", "short", "int", "long", "float", "double", "signed", "unsigned", "auto", "size_t",
+                "string", "str", "byte", "object", "i8", "i16", "i32", "i64", "u8", "u16", "u32", "u64", "f32", "f64", "usize", "isize"])
+_constants = set(["None", "True", "False", "null", "nullptr", "NULL", "nil", "true", "false", "self", "this", "cls"])
+
+_python_tokens = re.compile(r"(?P<comment>#[^\n]*)"
+                            r"|(?P<string>[rRbBuUfF]{0,2}(?:\"\"\"[\s\S]*?(?:\"\"\"|\Z)|'''[\s\S]*?(?:'''|\Z)|\"(?:\\.|[^\"\\\n])*\"?|'(?:\\.|[^'\\\n])*'?))"
+                            r"|(?P<number>\b\d[\w.]*)"
+                            r"|(?P<name>[A-Za-z_]\w*)"
+                            r"|(?P<arrow>->)"
+                            r"|(?P<punct>[()\[\]{},:;.=*@\-+/%<>!&|^~]+)")
+_c_tokens = re.compile(r"(?P<comment>//[^\n]*|/\*[\s\S]*?(?:\*/|\Z))"
+                       r"|(?P<string>\"(?:\\.|[^\"\\\n])*\"?|'(?:\\.|[^'\\\n]){1,10}')"
+                       r"|(?P<number>\b\d[\w.]*)"
+                       r"|(?P<name>[A-Za-z_$][\w$]*)"
+                       r"|(?P<arrow>->|=>|::)"
+                       r"|(?P<punct>[()\[\]{},:;.=*&@\-+/%<>!|^~?]+)")
+
+# syntaxes where the parameter name comes before its type, without a ":" ("func f(ctx context.Context)")
+_names_first = set(["go"])
+
+def _token_scope(kind, tok, prev, next_char, depth, is_python, names_first):
+	""" The scope name (without the suffix) for the token. """
+	if kind == "comment":
+		return "comment.line" if tok.startswith(("#", "//")) else "comment.block"
+	if kind == "string":
+		return "string.quoted"
+	if kind == "number":
+		return "constant.numeric"
+	if kind in ("arrow", "punct"):
+		if tok in ("(", ")"):
+			return "punctuation.section.parameters"
+		if tok == ",":
+			return "punctuation.separator.parameters"
+		return "keyword.operator"
+	# names
+	if tok in _constants:
+		return "constant.language" if tok not in ("self", "this", "cls") else "variable.language"
+	if tok in (_python_keywords if is_python else _c_keywords):
+		return "storage.modifier" if not is_python else "keyword.declaration"
+	if prev == None:
+		return "entity.name.function"
+	if depth > 0:
+		if is_python:
+			# a name followed by ",", "=", ":", or ")" is a parameter, otherwise it's an annotation
+			if prev in ("(", ",", "*", "**") and next_char in (",", "=", ":", ")", ""):
+				return "variable.parameter"
+			return "support.type"
+		if names_first:
+			return "variable.parameter" if prev in ("(", ",") else "storage.type"
+		if next_char in (",", ")", "=", "[", ":", ""):
+			return "variable.parameter"
+	if tok in _c_types or (not is_python and depth > 0):
+		return "storage.type"
+	return "support.type"
+
+def scope_spans(text, syntax_name, base_scope="source"):
+	""" Approximate the scope spans for the given definition text.
+
+	Args:
+	    text: the definition, starting at the symbol name (see extractors.Definition)
+	    syntax_name: the lower-case syntax name of the file
+	    base_scope: the scope for anything that isn't a recognized token
+	Returns:
+	    spans: A ScopeSpans covering the text, like HoverDocsListener.get_scope_spans(...).
+	"""
+	suffix = scope_suffixes.get(syntax_name)
+	if suffix == None:
+		return ScopeSpans.whole(len(text), base_scope)
+	is_python = syntax_name == "python"
+	pattern = _python_tokens if is_python else _c_tokens
+	source = f"source.{suffix}"
+	base_id = scope_stacks.intern(source)
+
+	ret = ScopeSpans()
+	pos, depth, prev = 0, 0, None
+	for m in pattern.finditer(text):
+		if m.start() > pos:
+			ret.append(pos, m.start()-pos, base_id)
+		kind, tok = m.lastgroup, m.group(0)
+		next_char = text[m.end():m.end()+20].lstrip()[:1]
+		scope = _token_scope(kind, tok, prev, next_char, depth, is_python, syntax_name in _names_first)
+		stack_id = scope_stacks.intern(f"{source} {scope}.{suffix}")
+		ret.append(m.start(), len(tok), stack_id)
+		if kind == "punct":
+			depth += tok.count("(") - tok.count(")")
+		if kind != "comment":
+			prev = tok if kind != "punct" or len(tok) == 1 else tok[-1]
+		pos = m.end()
+	if pos < len(text):
+		ret.append(pos, len(text)-pos, base_id)
+	return ret
+
+def comment_spans(text, syntax_name):
+	""" A single documentation comment span for the (already reduced) comment text. """
+	suffix = scope_suffixes.get(syntax_name)
+	if suffix == None:
+		return ScopeSpans.whole(len(text), "comment")
+	return ScopeSpans.whole(len(text), f"source.{suffix} comment.block.documentation.{suffix}")
@@ -0,0 +1,204 @@
+""" Replay recorded hover traces (see hoverdocs/trace.py) under cProfile, outside of the editor.
+
+Usage:
+    python -m hoverdocs.replay [--index N] [--repeat N] [--sort KEY] [--limit N] [--profile-output FILE] TRACE_FILE
+
+Each trace is replayed against the stand-in sublime module (see hoverdocs/stand_in): the recorded
+symbol_locations candidates are put in the index, the recorded definition file is written to a
+temporary directory (or opened in a view, if it was open when recorded), the view that was
+hovered over is recreated with its recorded text and class regions, and the settings snapshot is loaded.
+Then the symbol lookup (from the recorded reference point, so that member references are
+filtered by their receiver) and definition/comment extraction are run the same as for a hover. If the replay ran different stages than were recorded (for example the view-based
+find_def_and_comment instead of find_def_and_comment_fast), a warning is printed, since the
+profile is then of a different pipeline.
+
+Timings of the sublime API calls themselves don't match the editor, since the stand-in is much
+simpler, but the HoverDocs side of the pipeline is the same code.
+"""
+import argparse
+import contextlib
+import cProfile
+import importlib
+import io
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+from . import stand_in
+from . import trace
+
+_plugin_package = "HoverDocs"
+
+def load_plugin():
+	""" Import HoverDocs.py against the stand-in sublime modules.
+
+	Returns:
+	    plugin: the HoverDocs.py module
+	"""
+	stand_in.install()
+	if _plugin_package not in sys.modules:
+		pkg = types.ModuleType(_plugin_package)
+		pkg.__path__ = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+		sys.modules[_plugin_package] = pkg
+	return importlib.import_module(_plugin_package + ".HoverDocs")
+
+def _remap(root, path):
+	""" Move a recorded path to under the temporary root directory. """
+	if path == None:
+		return None
+	path = path.replace("\\", "/").replace(":", "")
+	return os.path.join(root, path.lstrip("/"))
+
+def ref_text(ref):
+	""" The text of the view that was hovered over. Version 3 traces only have the parts that
+	filter_by_receiver reads, so they're put back at their offsets, with blank lines in between.
+	"""
+	if "spans" not in ref:
+		return ref.get("text", "")
+	text = ["\n"] * ref["size"]
+	for span in ref["spans"]:
+		text[span["a"]:span["a"]+len(span["text"])] = span["text"]
+	return "".join(text)
+
+def setup(record, root):
+	""" Recreate the editor state for a trace record.
+
+	Args:
+	    record: the trace record
+	    root: the temporary directory to write the definition file to
+	Returns:
+	    ref_view: the (stand-in) view that the hover happened in
+	"""
+	import sublime
+	sublime.reset()
+	window = sublime.active_window()
+
+	# settings
+	settings = sublime.load_settings("HoverDocs.sublime-settings")
+	settings.update(record["settings"])
+	settings["hover_trace_file"] = ""
+
+	# the definition file
+	definition = record["definition"]
+	if definition != None:
+		if "text" in definition:
+			text = definition["text"]
+		else:
+			# version 1 traces only have a slice, padded with empty lines so that the rows still match
+			text = "\n".join([""]*definition["first_row"] + definition["lines"])
+		path = _remap(root, definition["path"])
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, 'w', encoding='utf-8') as f:
+			f.write(text)
+		if definition["was_open"]:
+			window.add_view(path, text)
+
+	# the index
+	def sym_locs(candidates):
+		return [sublime.SymbolLocation(_remap(root, c["path"]), c["display_name"], c["row"], c["col"], type=c["type"],
+		                               kind=(c.get("kind_id", sublime.KIND_ID_AMBIGUOUS), "", "")) for c in candidates]
+	for class_name, candidates in record.get("receiver_candidates", {}).items():
+		window.set_symbol_locations(class_name, sym_locs(candidates))
+	window.set_symbol_locations(record["token"], sym_locs(record["candidates"]))
+
+	# the view that was hovered over
+	ref = record["ref"]
+	ref_view = window.add_view(_remap(root, ref["path"]), ref_text(ref))
+	ref_view.set_symbol_regions([
+		sublime.SymbolRegion(sr["name"], sublime.Region(sr["a"], sr["b"]), type=1, kind=(sr["kind_id"], "", ""))
+		for sr in ref.get("symbol_regions", [])
+	] + [
+		# the classes were found by kind or by scope, and the stand-in view doesn't have class scopes
+		sublime.SymbolRegion(sr["name"], sublime.Region(sr["a"], sr["b"]), type=1, kind=(sublime.KIND_ID_TYPE, "", ""))
+		for sr in ref.get("class_regions", [])
+	])
+	if ref["syntax"] != None:
+		ref_view.assign_syntax(sublime.Syntax(ref["syntax"].title()))
+	if ref["tab_size"] != None:
+		ref_view.settings()["tab_size"] = ref["tab_size"]
+	return ref_view
+
+def replay(plugin, record, ref_view, repeat=1):
+	""" Run the symbol lookup and doc extraction for a trace record.
+
+	Returns:
+	    seconds: the average time for one hover
+	    stages: the names of the stages that ran, see HoverTrace.stage(...)
+	"""
+	listener = plugin.HoverDocsListener()
+	token = record["token"]
+	# older traces don't have the reference point, so filter_by_receiver is skipped for them
+	ref_point = record["ref"].get("point")
+	stages = set()
+	start = time.perf_counter()
+	for i in range(repeat):
+		# measure a cold hover
+		plugin.caches.clear()
+		plugin.snapshots.invalidate()
+		listener.trace = trace.HoverTrace()
+		with listener.trace_stage("find_symbol_definition"):
+			sym_loc = listener.find_symbol_definition(ref_view, token, ref_point)
+		if sym_loc != None:
+			listener.get_def_and_comment_strs(ref_view, sym_loc, token)
+		stages.update(listener.trace.record["timings"].keys())
+		listener.trace = None
+	return (time.perf_counter() - start) / repeat, stages
+
+def compare_stages(record, stages):
+	""" Returns a warning if the replayed stages don't match the recorded ones, otherwise None. """
+	recorded = set(record["timings"].keys()) - set(["total"])
+	if "find_def_and_comment_fast" not in recorded and "find_def_and_comment" not in recorded:
+		# the recorded hover was served from the doc cache, while replays are always cold
+		return None
+	if recorded == stages:
+		return None
+	missing = ", ".join(sorted(recorded - stages)) or "none"
+	extra = ", ".join(sorted(stages - recorded)) or "none"
+	return f"replayed stages differ from the recorded ones (not replayed: {missing}; only replayed: {extra}), the profile may not match the editor"
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m hoverdocs.replay", description="Replay HoverDocs hover traces under cProfile.")
+	parser.add_argument("trace_file", help="the trace file, from the hover_trace_file setting")
+	parser.add_argument("--index", type=int, action="append", default=[], help="which trace(s) in the file to replay (default: all)")
+	parser.add_argument("--repeat", type=int, default=1, help="replay each trace this many times")
+	parser.add_argument("--sort", default="cumulative", help="pstats sort key (default: cumulative)")
+	parser.add_argument("--limit", type=int, default=30, help="how many pstats lines to print")
+	parser.add_argument("--profile-output", default=None, help="also save the profile to this file, for other tools")
+	args = parser.parse_args(argv)
+
+	records = trace.read_traces(args.trace_file)
+	indexes = args.index if len(args.index) > 0 else range(len(records))
+	plugin = load_plugin()
+	profile = cProfile.Profile()
+
+	root = tempfile.mkdtemp(prefix="hoverdocs_replay_")
+	try:
+		for idx in indexes:
+			record = records[idx]
+			if record.get("version") not in trace.supported_versions:
+				print(f"[{idx}] skipping, unknown trace version {record.get('version')}")
+				continue
+			ref_view = setup(record, root)
+			with contextlib.redirect_stdout(io.StringIO()):
+				profile.enable()
+				seconds, stages = replay(plugin, record, ref_view, args.repeat)
+				profile.disable()
+			recorded = ", ".join(f"{k}={v*1000:.1f}ms" for k, v in record["timings"].items())
+			print(f"[{idx}] {record['token']!r}: {len(record['candidates'])} candidates, replayed in {seconds*1000:.1f}ms (recorded: {recorded})")
+			warning = compare_stages(record, stages)
+			if warning != None:
+				print(f"[{idx}] warning: {warning}")
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+	stats = pstats.Stats(profile)
+	stats.sort_stats(args.sort).print_stats(args.limit)
+	if args.profile_output != None:
+		stats.dump_stats(args.profile_output)
+
+if __name__ == "__main__":
+	main()
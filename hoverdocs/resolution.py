@@ -0,0 +1,137 @@
+""" Snapshots of the symbol resolution state, shared by every window open on the same project.
+
+find_symbol_definition asks a window's symbol index for the candidates for a name, and checks
+which of the candidate files are open. The answers are the same for every hover until a file is
+changed, loaded, or closed, so they're remembered here instead:
+    candidates: the index results for each name, by project (see project_key)
+    open files: the view for each open file path, across all windows and for each project
+
+Windows with the same set of folders share one project, and so share their candidates.
+The plugin calls invalidate(...) from its on_load, on_close, and on_activated handlers, and the
+snapshots are rebuilt on the next lookup. Saving a file only drops the candidates that involve
+that file, with invalidate_file(...), again after the delays that sublime takes to re-index it.
+
+Files can also be changed outside the editor, so remembered candidates are dropped when they're
+older than max_age.
+
+Windows and views are only used through their methods, so this module doesn't import sublime.
+"""
+import os
+import threading
+import time
+
+# rough size in bytes of a SymbolLocation, for the CacheRegistry
+_sym_loc_cost = 300
+
+def _candidates_cost(key, entry):
+	stored, sym_locs = entry
+	return 200 + _sym_loc_cost * len(sym_locs)
+
+def project_key(window):
+	""" Windows with the same folders share a project. Windows without folders are their own project. """
+	folders = window.folders()
+	if len(folders) == 0:
+		return ("window", window.id())
+	return tuple(sorted(os.path.normcase(os.path.normpath(folder)) for folder in folders))
+
+class ResolutionSnapshots:
+	def __init__(self, registry, get_windows, name="candidates", max_age=30):
+		"""
+		Args:
+		    registry: the CacheRegistry to store the candidates in
+		    get_windows: called to get the list of all windows (sublime.windows)
+		    name: the name of the candidates cache in the registry
+		    max_age: how long to trust the candidates for a name, in seconds
+		"""
+		self.get_windows = get_windows
+		self.max_age = max_age
+		# (project key, symbol name) -> (time stored, list of SymbolLocation)
+		self.candidates = registry.create(name, _candidates_cost)
+		self.lock = threading.Lock()
+		self.project_keys = None  # window id -> project key
+		self.open_files = None    # path -> view, for all windows
+		self.project_files = None # project key -> {path: view}
+
+	def invalidate(self, candidates=True):
+		""" Mark the snapshots as stale.
+
+		Args:
+		    candidates: False to only refresh the open files and projects, for example when a view
+		                is activated (which doesn't change the symbol index)
+		"""
+		with self.lock:
+			self.project_keys = None
+			self.open_files = None
+			self.project_files = None
+		if candidates:
+			self.candidates.clear()
+
+	def invalidate_file(self, path, names):
+		""" Drop the candidates for the names defined in a file, and any that are in the file.
+
+		Args:
+		    path: the file that was changed
+		    names: the names that the file defines, so that new definitions are found
+		"""
+		self.invalidate(candidates=False)
+		names = set(names)
+		for key in self.candidates.keys():
+			entry = self.candidates.peek(key)
+			if key[1] in names or (entry != None and any(sl.path == path for sl in entry[1])):
+				self.candidates.pop(key)
+
+	def _refresh(self):
+		""" Rebuild the open files and project keys, if they're stale. Returns (project_keys, open_files, project_files). """
+		with self.lock:
+			if self.open_files == None:
+				project_keys, open_files, project_files = {}, {}, {}
+				for window in self.get_windows():
+					key = project_key(window)
+					project_keys[window.id()] = key
+					files = project_files.setdefault(key, {})
+					for view in window.views():
+						path = view.file_name()
+						if path != None:
+							open_files.setdefault(path, view)
+							files.setdefault(path, view)
+				self.project_keys, self.open_files, self.project_files = project_keys, open_files, project_files
+			return self.project_keys, self.open_files, self.project_files
+
+	def get_project_key(self, window):
+		project_keys, open_files, project_files = self._refresh()
+		key = project_keys.get(window.id())
+		return project_key(window) if key == None else key
+
+	def symbol_locations(self, window, name):
+		""" The window's index results for name (as window.symbol_locations(sym=name)), shared by
+		every window on the same project. Don't modify the returned list.
+		"""
+		key = (self.get_project_key(window), name)
+		entry = self.candidates.get(key, count=False)
+		if entry != None:
+			stored, sym_locs = entry
+			if time.monotonic() - stored <= self.max_age:
+				self.candidates.record(True)
+				return sym_locs
+		self.candidates.record(False)
+		sym_locs = window.symbol_locations(sym=name)
+		self.candidates.put(key, (time.monotonic(), sym_locs))
+		return sym_locs
+
+	def find_open_file(self, path, window=None):
+		""" Find the view for the given path, or None if it isn't open.
+
+		Args:
+		    window: only look in the windows on the same project as this window, None for all windows
+		"""
+		for attempt in range(2):
+			project_keys, open_files, project_files = self._refresh()
+			if window != None:
+				view = project_files.get(project_keys.get(window.id()), {}).get(path)
+			else:
+				view = open_files.get(path)
+			if view == None or view.is_valid():
+				return view
+			# closed without an on_close (eg the window was closed), rebuild and try again
+			self.invalidate(candidates=False)
+		return None
@@ -0,0 +1,203 @@
+""" A small prioritized worker pool for HoverDocs background jobs.
+
+Jobs are run in priority order (see the PRIORITY_* values), and one worker is always kept free for
+PRIORITY_INTERACTIVE jobs, so that a long prefetch or maintenance job can't delay a hover.
+Each priority has a queue cap; submitting to a full queue is rejected instead of letting the
+queue grow without bound.
+
+Results are handed back through the "main_thread" callable given to the Scheduler, which for the
+plugin is sublime.set_timeout, so that callbacks run on sublime's main thread.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+PRIORITY_INTERACTIVE = 0 # key binding, hover
+PRIORITY_DOUBLE_CLICK = 1
+PRIORITY_PREFETCH = 2
+PRIORITY_MAINTENANCE = 3
+priority_names = ["interactive", "double_click", "prefetch", "maintenance"]
+
+default_queue_caps = [64, 64, 256, 256]
+
+class Cancelled(Exception):
+	pass
+
+class CancellationToken:
+	""" Shared between the submitter and a job, so that the job can be cancelled.
+
+	Jobs that have already started should call check() (or look at is_cancelled()) every so often.
+	"""
+	def __init__(self):
+		self._cancelled = False
+
+	def cancel(self):
+		self._cancelled = True
+
+	def is_cancelled(self):
+		return self._cancelled
+
+	def check(self):
+		""" Raises Cancelled if the job has been cancelled. """
+		if self._cancelled:
+			raise Cancelled()
+
+class Job:
+	def __init__(self, func, priority, token, on_done, on_error):
+		self.func = func
+		self.priority = priority
+		self.token = token
+		self.on_done = on_done
+		self.on_error = on_error
+		self.submit_time = time.perf_counter()
+
+class Scheduler:
+	def __init__(self, workers=2, queue_caps=None, main_thread=None):
+		"""
+		Args:
+		    workers: the number of worker threads, at least 2 (one is reserved for interactive jobs)
+		    queue_caps: the maximum number of queued jobs for each priority, None for default_queue_caps
+		    main_thread: called with a callback to run it on the main thread, None to run callbacks on the worker
+		"""
+		self.workers = max(2, workers)
+		self.queue_caps = list(default_queue_caps if queue_caps is None else queue_caps)
+		self.main_thread = main_thread
+		self.queue = [] # heap of (priority, seq, job)
+		self.seq = itertools.count()
+		self.cond = threading.Condition()
+		self.threads = []
+		self.generation = 0 # incremented by shutdown(), so that its workers exit even if start() is called right after
+		self.running = set() # the jobs that workers are running
+		self.background_running = 0
+		self.stopped = False
+		self.metrics = [{
+			"queued": 0,
+			"submitted": 0,
+			"started": 0,
+			"completed": 0,
+			"failed": 0,
+			"cancelled": 0,
+			"rejected": 0,
+			"wait_total": 0.0,
+			"wait_max": 0.0,
+		} for name in priority_names]
+
+	def start(self):
+		""" Start the workers. The scheduler can be started again after shutdown(), the previous
+		workers exit as soon as they've finished their current job.
+		"""
+		with self.cond:
+			self.stopped = False
+			while len(self.threads) < self.workers:
+				thread = threading.Thread(target=self._work, args=(self.generation,), name=f"HoverDocs worker {len(self.threads)}", daemon=True)
+				self.threads.append(thread)
+				thread.start()
+
+	def shutdown(self):
+		""" Stop the workers, cancelling all queued jobs. Running jobs are cancelled, but not waited on. """
+		with self.cond:
+			self.stopped = True
+			self.generation += 1
+			for priority, seq, job in self.queue:
+				job.token.cancel()
+				self.metrics[priority]["queued"] -= 1
+				self.metrics[priority]["cancelled"] += 1
+			self.queue = []
+			for job in self.running:
+				job.token.cancel()
+			self.threads = []
+			self.cond.notify_all()
+
+	def submit(self, func, priority=PRIORITY_MAINTENANCE, token=None, on_done=None, on_error=None):
+		""" Queue func(token) to be run on a worker thread.
+
+		Args:
+		    func: the job, called with the job's CancellationToken
+		    priority: one of the PRIORITY_* values
+		    token: the CancellationToken for the job, None to create one
+		    on_done: called with the result of func, on the main thread
+		    on_error: called with the exception if func raises (other than Cancelled), on the main thread
+		Returns:
+		    token: The job's CancellationToken, or None if the queue for this priority is full.
+		"""
+		token = CancellationToken() if token is None else token
+		job = Job(func, priority, token, on_done, on_error)
+		with self.cond:
+			metrics = self.metrics[priority]
+			if self.stopped or metrics["queued"] >= self.queue_caps[priority]:
+				metrics["rejected"] += 1
+				return None
+			metrics["queued"] += 1
+			metrics["submitted"] += 1
+			heapq.heappush(self.queue, (priority, next(self.seq), job))
+			self.cond.notify()
+		return token
+
+	def _next_job(self, generation):
+		""" Wait for the next job that this worker is allowed to run. Returns None to stop. """
+		with self.cond:
+			while True:
+				if self.stopped or generation != self.generation:
+					return None
+				if len(self.queue) > 0:
+					priority = self.queue[0][0]
+					# keep a worker free for interactive jobs
+					if priority == PRIORITY_INTERACTIVE or self.background_running < self.workers - 1:
+						job = heapq.heappop(self.queue)[2]
+						metrics = self.metrics[priority]
+						metrics["queued"] -= 1
+						metrics["started"] += 1
+						wait = time.perf_counter() - job.submit_time
+						metrics["wait_total"] += wait
+						metrics["wait_max"] = max(metrics["wait_max"], wait)
+						if priority != PRIORITY_INTERACTIVE:
+							self.background_running += 1
+						self.running.add(job)
+						return job
+				self.cond.wait()
+
+	def _work(self, generation):
+		while True:
+			job = self._next_job(generation)
+			if job == None:
+				return
+			result, error, status = None, None, "completed"
+			try:
+				job.token.check()
+				result = job.func(job.token)
+			except Cancelled:
+				status = "cancelled"
+			except Exception as e:
+				error, status = e, "failed"
+			with self.cond:
+				self.running.discard(job)
+				self.metrics[job.priority][status] += 1
+				if job.priority != PRIORITY_INTERACTIVE:
+					self.background_running -= 1
+					self.cond.notify_all()
+
+			if status == "completed" and job.on_done != None and not job.token.is_cancelled():
+				self._to_main_thread(lambda job=job, result=result: job.on_done(result))
+			elif status == "failed":
+				if job.on_error != None:
+					self._to_main_thread(lambda job=job, error=error: job.on_error(error))
+				else:
+					print(f"HoverDocs: background job failed: {error!r}")
+
+	def _to_main_thread(self, callback):
+		if self.main_thread == None:
+			callback()
+		else:
+			self.main_thread(callback)
+
+	def stats(self):
+		""" Returns the metrics for each priority, by name. Queued is the current queue depth. """
+		with self.cond:
+			ret = {}
+			for priority, name in enumerate(priority_names):
+				metrics = dict(self.metrics[priority])
+				metrics["wait_avg"] = 0.0 if metrics["started"] == 0 else metrics["wait_total"] / metrics["started"]
+				ret[name] = metrics
+			ret["background_running"] = self.background_running
+			return ret
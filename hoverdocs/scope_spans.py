@@ -0,0 +1,88 @@
+""" A compact representation of the scope spans returned by HoverDocsListener.get_scope_spans.
+
+Instead of a list of [idx, len, [scope names...]] per span, the spans are stored as parallel
+array('I') columns of offsets, lengths, and scope stack ids. The stack ids index into a shared
+table of interned scope stacks, so each distinct stack (for example
+"source.python meta.function.python entity.name.function.python") is split and stored once.
+
+The table only grows, so it's registered with the plugin's CacheRegistry, which clears it when the
+memory budget is exceeded. Stack ids are only valid until then, so ScopeSpans must not be kept
+past the hover that created them (the doc cache stores the rendered html instead).
+"""
+import sys
+from array import array
+
+# rough per-entry overhead in bytes, for the dict and list slots
+_entry_overhead = 100
+
+class ScopeStackTable:
+	""" Interns scope stacks. Each distinct stack gets an id, and is stored once as a tuple of scope names. """
+	def __init__(self):
+		self.ids = {}    # scope_name string (as returned by view.scope_name) -> id
+		self.stacks = [] # id -> tuple of scope names
+		self.size = 0    # approximate size in bytes, see nbytes()
+
+	def intern(self, scope_name):
+		""" Get the id for the given space-separated scope name string. """
+		stack_id = self.ids.get(scope_name)
+		if stack_id == None:
+			stack = tuple(s for s in scope_name.split(" ") if s != "")
+			key = " ".join(stack)
+			stack_id = self.ids.get(key)
+			if stack_id == None:
+				stack_id = len(self.stacks)
+				self.stacks.append(stack)
+				self.ids[key] = stack_id
+				self.size += _entry_overhead + sys.getsizeof(key) + sys.getsizeof(stack) + sum(sys.getsizeof(s) for s in stack)
+			if scope_name != key:
+				self.ids[scope_name] = stack_id
+				self.size += _entry_overhead + sys.getsizeof(scope_name)
+		return stack_id
+
+	def __getitem__(self, stack_id):
+		return self.stacks[stack_id]
+
+	def clear(self):
+		self.ids = {}
+		self.stacks = []
+		self.size = 0
+
+	def nbytes(self):
+		""" Approximate size of the table in bytes, kept up to date by intern(...) so that it's cheap
+		to check on every cache update.
+		"""
+		return self.size
+
+# shared by all ScopeSpans
+scope_stacks = ScopeStackTable()
+
+class ScopeSpans:
+	""" Parallel columns of offset, length, and scope stack id for each span.
+
+	Iterating yields (idx, len, scope_names) tuples, where scope_names is the interned tuple for
+	the span's stack (not a copy).
+	"""
+	__slots__ = ("offsets", "lengths", "stack_ids")
+
+	def __init__(self, offsets=None, lengths=None, stack_ids=None):
+		self.offsets = array('I') if offsets is None else offsets
+		self.lengths = array('I') if lengths is None else lengths
+		self.stack_ids = array('I') if stack_ids is None else stack_ids
+
+	@classmethod
+	def whole(cls, length, scope_name):
+		""" A single span of the given length, with the given scope name string. """
+		return cls(array('I', [0]), array('I', [length]), array('I', [scope_stacks.intern(scope_name)]))
+
+	def append(self, idx, length, stack_id):
+		self.offsets.append(idx)
+		self.lengths.append(length)
+		self.stack_ids.append(stack_id)
+
+	def __len__(self):
+		return len(self.offsets)
+
+	def __iter__(self):
+		stacks = scope_stacks.stacks
+		for i in range(len(self.offsets)):
+			yield self.offsets[i], self.lengths[i], stacks[self.stack_ids[i]]
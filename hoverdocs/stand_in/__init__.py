@@ -0,0 +1,17 @@
+""" Stand-in sublime and sublime_plugin modules, for running the plugin code outside of the editor.
+
+Only the parts of the API that HoverDocs uses are implemented. Syntax scopes are approximated:
+everything is "source.<syntax>", except for comments (and python docstrings), which are also
+"comment.block.<syntax>". Good enough to exercise the extraction pipeline, not to match
+sublime's output exactly.
+
+Use install() to put them in sys.modules before importing HoverDocs.py.
+"""
+import sys
+
+def install():
+	""" Make "import sublime" and "import sublime_plugin" load the stand-ins. """
+	from . import sublime, sublime_plugin
+	sys.modules["sublime"] = sublime
+	sys.modules["sublime_plugin"] = sublime_plugin
+	return sublime, sublime_plugin
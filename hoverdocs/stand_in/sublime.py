@@ -0,0 +1,499 @@
+""" Stand-in for the sublime module. See hoverdocs/stand_in/__init__.py.
+
+Besides the sublime API, this module has a few helpers for setting up the editor state:
+reset(), Window.add_view(...), and Window.set_symbol_locations(...).
+"""
+import bisect
+import io
+import re
+import tokenize
+import zlib
+
+from .. import comments
+from .. import extractors
+from . import sublime_plugin
+
+KIND_ID_AMBIGUOUS = 0
+KIND_ID_KEYWORD = 1
+KIND_ID_TYPE = 2
+KIND_ID_FUNCTION = 3
+KIND_ID_NAMESPACE = 4
+KIND_ID_NAVIGATION = 5
+KIND_ID_MARKUP = 6
+KIND_ID_VARIABLE = 7
+KIND_ID_SNIPPET = 8
+
+class Region:
+	__slots__ = ("a", "b")
+
+	def __init__(self, a, b=None):
+		self.a = a
+		self.b = a if b is None else b
+
+	def begin(self):
+		return min(self.a, self.b)
+
+	def end(self):
+		return max(self.a, self.b)
+
+	def size(self):
+		return abs(self.b - self.a)
+
+	def empty(self):
+		return self.a == self.b
+
+	def contains(self, x):
+		if isinstance(x, Region):
+			return self.begin() <= x.begin() and x.end() <= self.end()
+		return self.begin() <= x <= self.end()
+
+	def __eq__(self, other):
+		return isinstance(other, Region) and self.a == other.a and self.b == other.b
+
+	def __hash__(self):
+		return hash((self.a, self.b))
+
+	def __repr__(self):
+		return f"Region({self.a}, {self.b})"
+
+class Syntax:
+	def __init__(self, name):
+		self.name = name
+		self.scope = "source." + name.lower()
+		self.path = f"Packages/{name}/{name}.sublime-syntax"
+
+def _syntax_for_path(path):
+	syntax_name = comments.get_syntax_name(path)
+	return None if syntax_name == None else Syntax(syntax_name.title())
+
+class SymbolLocation:
+	def __init__(self, path, display_name, row, col, syntax="", type=1, kind=(0, "", "")):
+		self.path = path
+		self.display_name = display_name
+		self.row = row
+		self.col = col
+		self.syntax = syntax
+		self.type = type
+		self.kind = kind
+
+class SymbolRegion:
+	def __init__(self, name, region, syntax="", type=1, kind=(KIND_ID_AMBIGUOUS, "", "")):
+		self.name = name
+		self.region = region
+		self.syntax = syntax
+		self.type = type
+		self.kind = kind
+
+class Settings:
+	def __init__(self, values=None):
+		self.values = {} if values is None else dict(values)
+
+	def __getitem__(self, key):
+		return self.values[key]
+
+	def __setitem__(self, key, value):
+		self.values[key] = value
+
+	def __contains__(self, key):
+		return key in self.values
+
+	def get(self, key, default=None):
+		return self.values.get(key, default)
+
+	def set(self, key, value):
+		self.values[key] = value
+
+	def update(self, values):
+		self.values.update(values)
+
+	def to_dict(self):
+		return dict(self.values)
+
+class Selection:
+	def __init__(self):
+		self.regions = []
+
+	def clear(self):
+		self.regions = []
+
+	def add(self, x):
+		self.regions.append(x if isinstance(x, Region) else Region(x, x))
+
+	def __iter__(self):
+		return iter(list(self.regions))
+
+	def __len__(self):
+		return len(self.regions)
+
+	def __getitem__(self, idx):
+		return self.regions[idx]
+
+# python comments and docstrings, for when tokenize can't handle the text
+_python_comments = re.compile(r"#[^\n]*|\"\"\"[\s\S]*?(?:\"\"\"|\Z)|'''[\s\S]*?(?:'''|\Z)")
+
+class View:
+	def __init__(self, window=None, path=None, text="", syntax=None):
+		self._window = window
+		self._path = path
+		self._text = text
+		self._syntax = syntax
+		self._settings = Settings({ "tab_size": 4, "syntax_detection_size_limit": 16*1024*1024 })
+		self._sel = Selection()
+		self._scratch = False
+		self._symbol_regions = []
+		self._change_count = -1
+		self._changed()
+
+	def _changed(self):
+		self._change_count += 1
+		self._line_starts = None
+		self._comment_regs = None
+
+	# properties
+
+	def file_name(self):
+		return self._path
+
+	def window(self):
+		return self._window
+
+	def is_valid(self):
+		return True
+
+	def change_count(self):
+		return self._change_count
+
+	def syntax(self):
+		return self._syntax
+
+	def assign_syntax(self, syntax):
+		self._syntax = syntax if isinstance(syntax, Syntax) else Syntax(str(syntax))
+		self._changed()
+
+	def settings(self):
+		return self._settings
+
+	def set_scratch(self, scratch):
+		self._scratch = scratch
+
+	def is_dirty(self):
+		return False
+
+	def sel(self):
+		return self._sel
+
+	def viewport_extent(self):
+		return (800.0, 600.0)
+
+	# text
+
+	def size(self):
+		return len(self._text)
+
+	def substr(self, x):
+		if isinstance(x, Region):
+			return self._text[x.begin():x.end()]
+		return self._text[x:x+1]
+
+	def insert(self, edit, pt, characters):
+		self._text = self._text[:pt] + characters + self._text[pt:]
+		self._changed()
+		return len(characters)
+
+	def replace(self, edit, reg, characters):
+		self._text = self._text[:reg.begin()] + characters + self._text[reg.end():]
+		self._changed()
+
+	def erase(self, edit, reg):
+		self.replace(edit, reg, "")
+
+	def _starts(self):
+		if self._line_starts == None:
+			self._line_starts = extractors.get_line_starts(self._text)
+		return self._line_starts
+
+	def _row(self, pt):
+		pt = max(0, min(pt, self.size()))
+		return bisect.bisect_right(self._starts(), pt) - 1
+
+	def rowcol(self, pt):
+		row = self._row(pt)
+		return row, max(0, min(pt, self.size())) - self._starts()[row]
+
+	def text_point(self, row, col):
+		starts = self._starts()
+		row = max(0, min(row, len(starts)-1))
+		return min(starts[row] + col, self.size())
+
+	def _line_region(self, row, full=False):
+		starts = self._starts()
+		a = starts[row]
+		b = starts[row+1] if row+1 < len(starts) else self.size()
+		if not full and row+1 < len(starts):
+			b -= 1
+		return Region(a, b)
+
+	def line(self, x):
+		if isinstance(x, Region):
+			return Region(self.line(x.begin()).a, self.line(x.end()).b)
+		return self._line_region(self._row(x))
+
+	def full_line(self, x):
+		if isinstance(x, Region):
+			return Region(self.full_line(x.begin()).a, self.full_line(x.end()).b)
+		return self._line_region(self._row(x), full=True)
+
+	def lines(self, reg):
+		return [self._line_region(row) for row in range(self._row(reg.begin()), self._row(reg.end())+1)]
+
+	# scopes
+
+	def _syntax_key(self):
+		return "plain text" if self._syntax == None else self._syntax.name.lower()
+
+	def _comments(self):
+		""" The (a, b) offsets of each comment, in order. """
+		if self._comment_regs != None:
+			return self._comment_regs
+		syntax_name = self._syntax_key()
+		regs = []
+		if syntax_name == "python":
+			regs = self._python_comments()
+		elif extractors.get_extractor(syntax_name) == extractors.extract_c_family:
+			regs = extractors.scan_c_comments(self._text, syntax_name)
+		self._comment_regs = regs
+		return regs
+
+	def _python_comments(self):
+		starts = self._starts()
+		regs = []
+		try:
+			prev_type = None
+			string_tok = None
+			for tok in tokenize.generate_tokens(io.StringIO(self._text).readline):
+				if string_tok != None and tok.type in (tokenize.NEWLINE, tokenize.NL, tokenize.ENDMARKER, tokenize.COMMENT):
+					regs.append(string_tok)
+				string_tok = None
+				a = starts[tok.start[0]-1] + tok.start[1]
+				b = starts[tok.end[0]-1] + tok.end[1]
+				if tok.type == tokenize.COMMENT:
+					regs.append((a, b))
+				elif tok.type == tokenize.STRING and prev_type in (None, tokenize.NEWLINE, tokenize.NL, tokenize.INDENT, tokenize.DEDENT):
+					# a string by itself on a line: a docstring
+					string_tok = (a, b)
+				if tok.type not in (tokenize.COMMENT,):
+					prev_type = tok.type
+		except (tokenize.TokenError, IndentationError, SyntaxError):
+			regs = [m.span() for m in _python_comments.finditer(self._text)]
+		regs.sort()
+		return regs
+
+	def _comment_at(self, pt):
+		regs = self._comments()
+		idx = bisect.bisect_right(regs, (pt, float("inf"))) - 1
+		if idx >= 0 and regs[idx][0] <= pt < regs[idx][1]:
+			return regs[idx]
+		return None
+
+	def scope_name(self, pt):
+		syntax_name = self._syntax_key()
+		ret = f"source.{syntax_name} "
+		if self._comment_at(pt) != None:
+			ret += f"comment.block.{syntax_name} "
+		return ret
+
+	def extract_scope(self, pt):
+		reg = self._comment_at(pt)
+		if reg != None:
+			return Region(reg[0], reg[1])
+
+		# the code between the surrounding comments
+		regs = self._comments()
+		idx = bisect.bisect_right(regs, (pt, float("inf")))
+		a = 0 if idx == 0 else regs[idx-1][1]
+		b = self.size() if idx >= len(regs) else regs[idx][0]
+		return Region(a, b)
+
+	def style_for_scope(self, scope):
+		if "comment" in scope:
+			return { "foreground": "#7f7f7f" }
+		if scope == "" or scope.startswith("source"):
+			return { "foreground": "#e0e0e0" }
+		return { "foreground": "#%06x" % (zlib.crc32(scope.encode("utf-8")) & 0xffffff) }
+
+	def symbol_regions(self):
+		return list(self._symbol_regions)
+
+	def set_symbol_regions(self, symbol_regions):
+		""" Stand-in helper: set the symbol_regions() results. """
+		self._symbol_regions = list(symbol_regions)
+
+	def find_all(self, pattern, flags=0, fmt=None, extractions=None):
+		ret = []
+		for m in re.finditer(pattern, self._text, re.MULTILINE):
+			ret.append(Region(m.start(), m.end()))
+			if fmt != None and extractions != None:
+				extractions.append(m.expand(re.sub(r"\$(\d)", r"\\\1", fmt)))
+		return ret
+
+	def extract_tokens_with_scopes(self, reg):
+		line = self.line(reg.a)
+		line_str = self.substr(line)
+		for m in re.finditer(r"\w+", line_str):
+			if line.a + m.start() <= reg.a <= line.a + m.end():
+				a = line.a + m.start()
+				return [(Region(a, line.a + m.end()), self.scope_name(a))]
+		return []
+
+	# commands
+
+	def run_command(self, cmd, args=None):
+		if cmd == "toggle_comment":
+			self._toggle_comment()
+		elif cmd in sublime_plugin.text_commands:
+			sublime_plugin.text_commands[cmd](self).run(None, **({} if args is None else args))
+
+	def _toggle_comment(self):
+		markers = comments.line_comments.get(self._syntax_key(), [])
+		if len(markers) == 0:
+			return
+		for sel in list(self._sel):
+			line = self.line(sel.a)
+			line_str = self.substr(line)
+			ws, nonws = comments.split_line(line_str)
+			for marker in markers:
+				if nonws.startswith(marker):
+					nonws = nonws[len(marker):]
+					if nonws.startswith(" "):
+						nonws = nonws[1:]
+					break
+			else:
+				nonws = markers[0] + " " + nonws
+			self.replace(None, line, ws + nonws)
+
+	# no-op display
+
+	def show_popup(self, *vargs, **kwargs):
+		pass
+
+	def hide_popup(self):
+		pass
+
+	def add_regions(self, *vargs, **kwargs):
+		pass
+
+	def erase_regions(self, key):
+		pass
+
+	def show_at_center(self, x):
+		pass
+
+class Window:
+	_next_id = 1
+
+	def __init__(self, folders=None):
+		self._id = Window._next_id
+		Window._next_id += 1
+		self._folders = [] if folders == None else list(folders)
+		self._views = []
+		self._panels = {}
+		self._symbol_locations = {}
+
+	def id(self):
+		return self._id
+
+	def folders(self):
+		return list(self._folders)
+
+	def views(self):
+		return list(self._views)
+
+	def active_view(self):
+		return None if len(self._views) == 0 else self._views[0]
+
+	def add_view(self, path, text=None):
+		""" Stand-in helper: open a view for the given path, with the given (or on-disk) text. """
+		if text == None:
+			with open(path, 'r', encoding='utf-8', errors='replace') as f:
+				text = f.read()
+		view = View(self, path, text, _syntax_for_path(path))
+		self._views.append(view)
+		return view
+
+	def set_symbol_locations(self, sym, sym_locs):
+		""" Stand-in helper: set the index results for the given symbol name. """
+		self._symbol_locations[sym] = list(sym_locs)
+
+	def symbol_locations(self, sym, source=0, type=0, kind_id=0, kind_letter=""):
+		return list(self._symbol_locations.get(sym, []))
+
+	def find_open_file(self, path):
+		for view in self._views:
+			if view.file_name() == path:
+				return view
+		return None
+
+	def open_file(self, fname, flags=0, group=-1):
+		path = fname
+		if flags & 1:
+			path = re.sub(r"(:\d+){1,2}$", "", fname)
+		view = self.find_open_file(path)
+		if view == None:
+			view = self.add_view(path)
+		return view
+
+	def focus_view(self, view):
+		pass
+
+	def status_message(self, msg):
+		pass
+
+	def create_output_panel(self, name, unlisted=False):
+		view = View(self)
+		self._panels[name] = view
+		return view
+
+	def find_output_panel(self, name):
+		return self._panels.get(name)
+
+	def destroy_output_panel(self, name):
+		self._panels.pop(name, None)
+
+	def run_command(self, cmd, args=None):
+		if cmd in sublime_plugin.window_commands:
+			sublime_plugin.window_commands[cmd](self).run(**({} if args is None else args))
+
+_windows = [Window()]
+_settings = {}
+
+def reset():
+	""" Stand-in helper: start over with a single empty window and no settings. """
+	global _windows, _settings
+	_windows = [Window()]
+	_settings = {}
+
+def active_window():
+	return _windows[0]
+
+def windows():
+	return list(_windows)
+
+def load_settings(base_name):
+	if base_name not in _settings:
+		_settings[base_name] = Settings()
+	return _settings[base_name]
+
+def syntax_from_path(path):
+	return _syntax_for_path(path)
+
+def find_syntax_for_file(path, first_line=""):
+	return _syntax_for_path(path)
+
+def set_timeout(callback, delay=0):
+	callback()
+
+def set_timeout_async(callback, delay=0):
+	callback()
+
+def status_message(msg):
+	pass
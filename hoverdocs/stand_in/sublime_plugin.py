@@ -0,0 +1,46 @@
+""" Stand-in for sublime_plugin. See hoverdocs/stand_in/__init__.py. """
+import re
+
+# command name -> TextCommand subclass
+text_commands = {}
+# command name -> WindowCommand subclass
+window_commands = {}
+
+def command_name(cls):
+	""" "HoverDocsCommand" -> "hover_docs" """
+	name = cls.__name__
+	if name.endswith("Command"):
+		name = name[:-len("Command")]
+	return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+class TextCommand:
+	def __init__(self, view):
+		self.view = view
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		text_commands[command_name(cls)] = cls
+
+class WindowCommand:
+	def __init__(self, window):
+		self.window = window
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		window_commands[command_name(cls)] = cls
+
+class EventListener:
+	def __init__(self, *vargs, **kwargs):
+		pass
+
+class ViewEventListener:
+	def __init__(self, view):
+		self.view = view
+
+class TextChangeListener:
+	def __init__(self):
+		self.buffer = None
+
+	@classmethod
+	def is_applicable(cls, buffer):
+		return True
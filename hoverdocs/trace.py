@@ -0,0 +1,177 @@
+""" Recording hover requests, so that slow hovers can be replayed and profiled outside the editor.
+
+When the "hover_trace_file" setting is set, each hover is appended to that file as one gzipped
+JSON line, with:
+    token: the symbol name that was looked up
+    ref: the path, syntax, and tab_size of the view that the symbol was found in, and (for
+         find_symbol_definition's receiver filtering) the symbol's offset in the view, the
+         view's size, and only the parts of the view that filter_by_receiver reads: the symbol's
+         line, the import lines, and the enclosing class with its symbol regions
+    candidates: the sublime symbol_locations(...) results for the token
+    receiver_candidates: the symbol_locations(...) results for the receiver's class, by class name
+    definition: the path and syntax of the chosen definition's file, and the hash of its text
+    settings: a snapshot of the HoverDocs settings
+    timings: seconds spent in each stage of the hover
+
+The text of each definition file is written once per trace file, as a separate line with
+{"type": "file", "hash": ..., "text": ...}, before the first hover that refers to it.
+read_traces(...) puts the text back into each hover's definition.
+
+See hoverdocs/replay.py to replay the traces.
+"""
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+# 1: the definition was recorded as a slice of the lines around it
+# 2: the definition's whole file is recorded, so that replay takes the same extraction path
+# 3: file texts are recorded once per trace file, and only parts of the ref view are recorded
+trace_version = 3
+supported_versions = (1, 2, 3)
+
+class HoverTrace:
+	def __init__(self):
+		self.record = {
+			"version": trace_version,
+			"time": time.time(),
+			"token": None,
+			"ref": None,
+			"candidates": [],
+			"receiver_candidates": {},
+			"definition": None,
+			"settings": {},
+			"timings": {},
+		}
+		# hash -> text, for the files that the record refers to
+		self.files = {}
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		""" Time the enclosed block, adding it to the timings for the given stage. """
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			timings = self.record["timings"]
+			timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+	def set_ref(self, path, syntax_name, tab_size):
+		self.record["ref"] = { "path": path, "syntax": syntax_name, "tab_size": tab_size }
+
+	def set_ref_point(self, point, size, spans, class_regions):
+		""" Record where the symbol is in the ref view, and what filter_by_receiver looks at.
+
+		Args:
+		    point: the offset of the start of the symbol in the view
+		    size: the size of the view
+		    spans: (a, text) for each part of the view that filter_by_receiver reads, whole lines
+		    class_regions: the SymbolRegions of the classes in the spans, see get_class_regions(...)
+		"""
+		if self.record["ref"] == None:
+			self.record["ref"] = {}
+		self.record["ref"].update({
+			"point": point,
+			"size": size,
+			"spans": [{ "a": a, "text": text } for a, text in spans],
+			"class_regions": [{ "name": sr.name, "a": sr.region.a, "b": sr.region.b } for sr in class_regions],
+		})
+
+	def set_candidates(self, token, sym_locs):
+		""" Record the token and its SymbolLocation candidates. """
+		self.record["token"] = token
+		self.record["candidates"] = [_sym_loc_record(sl) for sl in sym_locs]
+
+	def add_receiver_candidates(self, class_name, sym_locs):
+		""" Record the SymbolLocations for the receiver's class, see filter_by_receiver. """
+		self.record["receiver_candidates"][class_name] = [_sym_loc_record(sl) for sl in sym_locs]
+
+	def set_definition(self, sym_loc, syntax_name, text, was_open):
+		""" Record the chosen definition, and the contents of its file (see files).
+
+		Args:
+		    sym_loc: the chosen SymbolLocation
+		    syntax_name: the lower-case syntax name of the definition file
+		    text: the contents of the definition file (or view, if open)
+		    was_open: True if the definition file was open in a view
+		"""
+		self.record["definition"] = {
+			"path": sym_loc.path,
+			"row": sym_loc.row,
+			"col": sym_loc.col,
+			"syntax": syntax_name,
+			"was_open": was_open,
+			"file": _add_file(self.files, text),
+		}
+
+	def set_settings(self, settings):
+		self.record["settings"] = settings
+
+def _add_file(files, text):
+	""" Add the text to files, and return its hash. """
+	key = hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+	files[key] = text
+	return key
+
+def _sym_loc_record(sl):
+	return {
+		"path": sl.path,
+		"display_name": sl.display_name,
+		"row": sl.row,
+		"col": sl.col,
+		"type": sl.type,
+		"kind_id": sl.kind[0],
+	}
+
+# traces can be written from more than one background worker at a time
+_write_lock = threading.Lock()
+# trace file path -> (its size after our last write, the hashes of the files written to it)
+_written_files = {}
+
+def write_trace(path, record, files={}):
+	""" Append a trace record to the given gzipped JSON Lines file, after the files it refers to
+	that aren't in the trace file yet.
+
+	Args:
+	    files: hash -> text, see HoverTrace.files
+	"""
+	path = os.path.expandvars(os.path.expanduser(path))
+	with _write_lock:
+		try:
+			size = os.path.getsize(path)
+		except OSError:
+			size = None
+		known_size, written = _written_files.get(path, (None, set()))
+		if size != known_size:
+			# a new trace file, or one that was replaced or written to by another instance
+			written = set()
+		lines = []
+		for key, text in files.items():
+			if key not in written:
+				lines.append(json.dumps({ "type": "file", "hash": key, "text": text }, separators=(",", ":")) + "\n")
+		lines.append(json.dumps(record, separators=(",", ":")) + "\n")
+		with gzip.open(path, 'at', encoding='utf-8') as f:
+			f.write("".join(lines))
+		written.update(files.keys())
+		_written_files[path] = (os.path.getsize(path), written)
+
+def read_traces(path):
+	""" Read all hover records from the given file, with the text of their definition's file. """
+	ret, files = [], {}
+	with gzip.open(path, 'rt', encoding='utf-8') as f:
+		for line in f:
+			if line.strip() == "":
+				continue
+			record = json.loads(line)
+			if record.get("type") == "file":
+				files[record["hash"]] = record["text"]
+			else:
+				ret.append(record)
+	for record in ret:
+		definition = record.get("definition")
+		if definition != None and "file" in definition:
+			definition["text"] = files.get(definition["file"], "")
+	return ret
@@ -0,0 +1,48 @@
+""" Regression tests for hoverdocs.extractors. Run with: python -m unittest discover tests """
+import unittest
+
+from hoverdocs import extractors
+
+python_docstrings = { "python": [['"""', '"""'], ["'''", "'''"]] }
+
+def comment_for(text, syntax_name, name, multi_line_docstrings={}):
+	for d in extractors.extract_definitions(text, syntax_name, multi_line_docstrings):
+		if d.name == name:
+			return text[d.comment_reg[0]:d.comment_reg[1]]
+	return None
+
+class CFamilyStringsTest(unittest.TestCase):
+	def test_javascript_single_quoted_string(self):
+		text = "const pattern = 'src/*.js, lib/*.js';\n\n/** Adds two numbers. */\nfunction add(a, b) {\n\treturn a + b;\n}\n"
+		self.assertEqual(comment_for(text, "javascript", "add"), "/** Adds two numbers. */")
+
+	def test_javascript_template_literal(self):
+		text = "const t = `a // not\n/* still not */ ${x}`;\n\n/** Adds two numbers. */\nfunction add(a, b) {\n}\n"
+		self.assertEqual(comment_for(text, "javascript", "add"), "/** Adds two numbers. */")
+		self.assertEqual(extractors.scan_c_comments(text, "javascript"), [(text.index("/**"), text.index("*/\nf") + 2)])
+
+	def test_php_single_quoted_string(self):
+		text = "<?php\n$u = 'see http://x.y';\n\n/** Does f. */\nfunction f($x) {\n}\n"
+		self.assertEqual(comment_for(text, "php", "f"), "/** Does f. */")
+
+	def test_rust_lifetimes(self):
+		text = "/// Borrows a.\npub fn get<'a>(x: &'a str) -> &'a str {\n\tx\n}\n"
+		self.assertEqual(comment_for(text, "rust", "get"), "/// Borrows a.")
+
+class FindDefinitionsTest(unittest.TestCase):
+	def test_rust_new(self):
+		lines = ["impl Foo {", "    pub fn new(x: i32) -> Foo {", "        Foo { x }", "    }", "}"]
+		self.assertIn(("new", 1, 11, 1, "new(x: i32)"), extractors.find_definitions(lines, "rust"))
+
+	def test_c_statements(self):
+		lines = ["int f(int x) {", "    if (x) {", "    } else if (x) {", "    }", "}"]
+		self.assertEqual([d[0] for d in extractors.find_definitions(lines, "c")], ["f"])
+
+class PythonTest(unittest.TestCase):
+	def test_deeply_nested_falls_back(self):
+		text = "def f():\n\t\"\"\" Doc. \"\"\"\n\treturn " + "("*1000 + "1" + ")"*1000 + "\n"
+		self.assertEqual(extractors.get_extractor("python")(text, "python", {}), None)
+		self.assertEqual(comment_for(text, "python", "f", python_docstrings).strip(), '""" Doc. """')
+
+if __name__ == "__main__":
+	unittest.main()